@@ -1,6 +1,12 @@
 verbosity = 2  # 0, 1, 2 or 3
 pattern_output_format = "blk"  # "rle" or "csv" or "blk"
-life_encoding_method = 0  # 0, 1 or 2
+life_encoding_method = 0  # 0, 1, 2 or 3
 rulestring = "B3/S23"  # Any valid rulestring
 solver = "kissat"  # Any solver in /solvers
 background = "vacuum"  # Any file in /backgrounds
+solvers_reading_files = []  # Solvers in /solvers that need a DIMACS file name rather than reading STDIN
+incremental_solver = "glucose4"  # Any solver PySAT provides (that can be interrupted, if using timeouts)
+portfolio = ["kissat"]  # Solvers in /solvers (each optionally followed by parameters) to race with --portfolio
+cnf_cache_directory = None  # Directory for cached clauses and rules (default is $XDG_CACHE_HOME/lls, or ~/.cache/lls)
+cnf_cache_size = 2 * 1024 ** 3  # Maximum size in bytes of the cache of clauses from earlier searches (0 disables it)
+cardinality_encoding = "totalizer"  # One of "totalizer", "sequential_counter", "modulo_totalizer", "sorting_network"
@@ -0,0 +1,108 @@
+from array import array
+import numpy as np
+import src.formatting
+from src.logging import log
+
+
+class ClauseList:
+    """
+    A list of clauses, stored flat
+
+    The literals of every clause sit one after another in a single
+    array, and a second array holds the position where each clause
+    starts (plus a final entry marking the end of the last one).
+
+    """
+
+    def __init__(self, clauses=()):
+        self.literals = array('i')
+        self.offsets = array('q', [0])
+        self.extend(clauses)
+
+    def append(self, clause):
+        self.literals.extend(clause)
+        self.offsets.append(len(self.literals))
+
+    def extend(self, clauses):
+        for clause in clauses:
+            self.append(clause)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __iter__(self):
+        literals = self.literals
+        offsets = self.offsets
+        for i in range(len(offsets) - 1):
+            yield literals[offsets[i]:offsets[i + 1]].tolist()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            literals = self.literals[self.offsets[start]:self.offsets[max(start, stop)]].tolist()
+            first_offset = self.offsets[start]
+            return [
+                literals[self.offsets[i] - first_offset:self.offsets[i + 1] - first_offset]
+                for i in range(start, max(start, stop))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("clause index out of range")
+        return self.literals[self.offsets[index]:self.offsets[index + 1]].tolist()
+
+    def unit_literals(self):
+        """The literals of the clauses with only one literal"""
+        literals = np.frombuffer(self.literals, dtype=np.int32)
+        offsets = np.frombuffer(self.offsets, dtype=np.int64)
+        return literals[offsets[:-1][np.diff(offsets) == 1]].tolist()
+
+    def variable_scores(self, number_of_variables):
+        """Jeroslow-Wang scores of the variables: every clause adds 2 ** -length to the score of each of its variables"""
+        literals = np.frombuffer(self.literals, dtype=np.int32)
+        lengths = np.diff(np.frombuffer(self.offsets, dtype=np.int64))
+        weights = np.repeat(np.exp2(-lengths.astype(float)), lengths)
+        return np.bincount(np.abs(literals), weights=weights, minlength=number_of_variables + 1)
+
+    def number_of_literals(self):
+        return len(self.literals)
+
+    def make_file(self, file_name, number_of_variables):
+        """Write the clauses to a DIMACS file"""
+        log('Writing DIMACS file "' + file_name + '" ...', 1)
+        with open(file_name, "w") as dimacs_file:
+            src.formatting.write_dimacs(self, number_of_variables, dimacs_file)
+        log('Done\n', -1)
+
+    @classmethod
+    def from_arrays(cls, literals, offsets):
+        """Makes a clause list from arrays of literals and offsets (such as memory-mapped ones), copying them in bulk"""
+        clause_list = cls()
+        clause_list.literals.frombytes(memoryview(np.ascontiguousarray(literals, dtype=np.int32)).cast("B"))
+        clause_list.offsets = array('q')
+        clause_list.offsets.frombytes(memoryview(np.ascontiguousarray(offsets, dtype=np.int64)).cast("B"))
+        return clause_list
+
+    @classmethod
+    def from_file(cls, file_name):
+        """Read the clauses from a DIMACS file, returning them with the number of variables"""
+        log('Reading DIMACS file "' + file_name + '" ...', 1)
+        clause_list = cls()
+        number_of_variables = 0
+        clause = array('i')
+        with open(file_name, "r") as dimacs_file:
+            for line in dimacs_file:
+                if line[:1] == "c":
+                    continue
+                elif line[:1] == "p":
+                    number_of_variables = int(line.split()[2])
+                    continue
+                for literal in map(int, line.split()):
+                    if literal == 0:
+                        clause_list.append(clause)
+                        clause = array('i')
+                    else:
+                        clause.append(literal)
+        log('Done\n', -1)
+        return clause_list, number_of_variables
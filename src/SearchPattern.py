@@ -1,16 +1,19 @@
 import collections
-import copy
 import itertools
 import ast
+import numpy as np
 import src.taocp_variable_scheme
+import src.minimized_truth_table
 import src.formatting
 import src.rules
+import src.cardinality
 import settings
 import src.files
 import src.literal_manipulation
 from src.logging import log
+from src.profiling import profiled
+from src.ClauseList import ClauseList
 from src.literal_manipulation import variable_from_literal, neighbours_from_coordinates, implies, standard_form_literal
-from src.utilities import make_grid
 
 class UnsatInPreprocessing(Exception):
     """
@@ -26,6 +29,7 @@ class UnsatInPreprocessing(Exception):
 
 class SearchPattern:
 
+    @profiled("SearchPattern.__init__")
     def __init__(
             self,
             grid,
@@ -34,69 +38,78 @@ class SearchPattern:
             background_ignore_transition=None,
             rulestring=None
     ):
-        self.clauses = [[1]]
+        self.clauses = ClauseList([[1]])
         self.number_of_variables = 1
 
-        self.grid = copy.deepcopy(grid)
-        self.ignore_transition = (
-            copy.deepcopy(ignore_transition)
-            if (ignore_transition is not None)
-            else make_grid(False, template=grid)
-        )
         if background_grid is None:
             (
                 background_grid,
-                self.background_ignore_transition
+                background_ignore_transition
             ) = src.formatting.parse_input_string(
                 src.files.string_from_file(
                     "backgrounds/" + settings.background,
                 )
             )
-        else:
-            self.background_ignore_transition = (
-                copy.deepcopy(background_ignore_transition)
-                if (background_ignore_transition is not None)
-                else make_grid(False, template=background_grid)
-            )
 
         if rulestring is None:
             rulestring = settings.rulestring
-        self.grid, self.background_grid, self.rule = self.prepare_variables(grid, background_grid, rulestring)
+        grid, background_grid, self.rule = self.prepare_variables(grid, background_grid, rulestring)
 
-        width = len(self.grid[0][0])
-        height = len(self.grid[0])
-        duration = len(self.grid)
-        background_width = len(self.background_grid[0][0])
-        background_height = len(self.background_grid[0])
-        background_duration = len(self.background_grid)
+        ignore_transition = (
+            np.array(ignore_transition, dtype=bool)
+            if (ignore_transition is not None)
+            else np.zeros(grid.shape, dtype=bool)
+        )
+        background_ignore_transition = (
+            np.array(background_ignore_transition, dtype=bool)
+            if (background_ignore_transition is not None)
+            else np.zeros(background_grid.shape, dtype=bool)
+        )
 
         # Surround the grid by one cell from the background, and offset the background accordingly
-        src.literal_manipulation.offset_background(self.background_grid, 1, 1, 0)
-        new_grid = make_grid("0", width + 2, height + 2, duration)
-        for x in range(width + 2):
-            for y in range(height + 2):
-                for t in range(duration):
-                    if x in range(1, width + 1) and y in range(1, height + 1):
-                        new_grid[t][y][x] = self.grid[t][y - 1][x - 1]
-                    else:
-                        new_grid[t][y][x] = self.background_grid[t % background_duration][y % background_height][
-                            x % background_width]
-        self.grid = new_grid
-        src.literal_manipulation.offset_background(self.background_ignore_transition, 1, 1, 0)
-        new_ignore_transition = make_grid("0", width + 2, height + 2, duration)
-        for x in range(width + 2):
-            for y in range(height + 2):
-                for t in range(duration):
-                    if 1 <= x <= width and 1 <= y <= height:
-                        new_ignore_transition[t][y][x] = self.ignore_transition[t][y - 1][x - 1]
-                    else:
-                        new_ignore_transition[t][y][x] = \
-                            self.background_ignore_transition[t % background_duration][y % background_height][
-                                x % background_width]
-        self.ignore_transition = new_ignore_transition
-
+        src.literal_manipulation.offset_background(background_grid, 1, 1, 0)
+        src.literal_manipulation.offset_background(background_ignore_transition, 1, 1, 0)
+        self.background_grid = background_grid
+        self.background_ignore_transition = background_ignore_transition
+        self.grid = self.pad_with_background(grid, self.background_grid)
+        self.ignore_transition = self.pad_with_background(ignore_transition, self.background_ignore_transition)
+
+        # The nodes of the totalizer trees, as (size, left node, right node), or (size, literals, None) for a leaf
+        self.cardinality_node_ids = dict()
+        self.cardinality_nodes = []
         self.cardinality_variables = dict()
         self.defined_cardinality_variables = set()
+        self.knuth_variables = dict()
+        self.defined_knuth_variables = dict()
+
+    # The attributes that describe a search pattern once it's been created
+    state_attributes = (
+        "grid",
+        "ignore_transition",
+        "background_grid",
+        "background_ignore_transition",
+        "rule",
+        "number_of_variables",
+        "cardinality_node_ids",
+        "cardinality_nodes",
+        "cardinality_variables",
+        "defined_cardinality_variables",
+        "knuth_variables",
+        "defined_knuth_variables",
+        "clauses"
+    )
+
+    def state(self):
+        """Everything needed to carry on with the search pattern, as a dictionary"""
+        return {name: getattr(self, name) for name in self.state_attributes}
+
+    @classmethod
+    def from_state(cls, state):
+        """Recreates a search pattern from its state"""
+        search_pattern = cls.__new__(cls)
+        for name in cls.state_attributes:
+            setattr(search_pattern, name, state[name])
+        return search_pattern
 
     def prepare_variables(self, grid, background_grid, rulestring):
         input_literals = [cell for generation in grid for row in generation for cell in row] +\
@@ -130,29 +143,8 @@ class SearchPattern:
 
         variable_dict['0'] = -1
 
-        new_grid = make_grid(None, template=grid)
-        for t, generation in enumerate(grid):
-            for y, row in enumerate(generation):
-                for x, cell in enumerate(row):
-                    variable_string, sign = variable_from_literal(standard_form_literal(cell))
-                    if variable_string == '*':
-                        self.number_of_variables += 1
-                        variable = self.number_of_variables
-                    else:
-                        variable = variable_dict[variable_string]
-                    new_grid[t][y][x] = variable * sign
-
-        new_background_grid = make_grid(None, template=background_grid)
-        for t, generation in enumerate(background_grid):
-            for y, row in enumerate(generation):
-                for x, cell in enumerate(row):
-                    variable_string, sign = variable_from_literal(standard_form_literal(cell))
-                    if variable_string == '*':
-                        self.number_of_variables += 1
-                        variable = self.number_of_variables
-                    else:
-                        variable = variable_dict[variable_string]
-                    new_background_grid[t][y][x] = variable * sign
+        new_grid = self.literal_array(grid, variable_dict)
+        new_background_grid = self.literal_array(background_grid, variable_dict)
 
         if rulestring[0] == '{':
             new_rule = dict()
@@ -169,79 +161,119 @@ class SearchPattern:
 
         return new_grid, new_background_grid, new_rule
 
+    def literal_array(self, grid, variable_dict):
+        """Converts a grid of strings into an array of literals, giving each "*" a new variable"""
+        variables, signs = zip(*(
+            variable_from_literal(standard_form_literal(cell))
+            for generation in grid for row in generation for cell in row
+        ))
+        stars = np.array([variable == '*' for variable in variables], dtype=bool)
+        literals = np.array([variable_dict.get(variable, 0) for variable in variables], dtype=np.int32)
+        literals[stars] = np.arange(
+            self.number_of_variables + 1, self.number_of_variables + 1 + np.count_nonzero(stars), dtype=np.int32)
+        self.number_of_variables += int(np.count_nonzero(stars))
+        literals *= np.array(signs, dtype=np.int32)
+        return literals.reshape(len(grid), len(grid[0]), len(grid[0][0]))
+
+    @staticmethod
+    def pad_with_background(grid, background_grid):
+        """Surrounds the grid by one cell taken from the (already offset) background"""
+        duration, height, width = grid.shape
+        background_duration, background_height, background_width = background_grid.shape
+        new_grid = background_grid[np.ix_(
+            np.arange(duration) % background_duration,
+            np.arange(height + 2) % background_height,
+            np.arange(width + 2) % background_width
+        )]
+        new_grid[:, 1:height + 1, 1:width + 1] = grid
+        return new_grid
+
     def number_of_cells(self):
-        return len(set(abs(cell) for generation in self.grid for row in generation for cell in row if
-                       cell not in [1, -1]))
+        return int(np.unique(np.abs(self.grid[np.abs(self.grid) != 1])).size)
 
+    @profiled("remove_redundancies")
     def remove_redundancies(self):
         log("Removing redundant transitions...", 1)
+        # Neighbourhoods seen so far (in the background and the grid), keyed by the predecessor cell and the sorted
+        # neighbours, with the cell they lead to
         parents_dict = {}
-        to_force_equal = []
-        background_duration = len(self.background_grid)
-        for t, generation in enumerate(self.background_grid):
-            for y, row in enumerate(generation):
-                for x, cell in enumerate(row):
-                    predecessor_cell = self.background_grid[(t - 1) % background_duration][y][x]
-                    neighbours = neighbours_from_coordinates(self.background_grid, x, y, t,
-                                                             background_grid=self.background_grid)
-                    if not self.background_ignore_transition[t][y][x]:
-                        parents = [predecessor_cell] + list(src.rules.sort_neighbours(neighbours))
-                        parents_string = str(parents)
-                        if parents_string in parents_dict:
-                            self.background_grid[t][y][x] = parents_dict[parents_string]
-                            to_force_equal.append((parents_dict[parents_string], cell))
-                            self.background_ignore_transition[t][y][x] = True
-                        elif all(parent in [-1, 1] for parent in parents):
-                            bs_letter = ["B", "S"][[-1, 1].index(predecessor_cell)]
-                            transition = src.rules.transition_from_cells(neighbours)
-                            child = self.rule[bs_letter + transition]
-                            if cell not in [-1, 1]:
-                                self.background_grid[t][y][x] = child
-                            to_force_equal.append((cell, child))
-                            self.background_ignore_transition[t][y][x] = True
-                            parents_dict[parents_string] = self.background_grid[t][y][x]
-                        else:
-                            parents_dict[parents_string] = cell
+        background_grid = self.background_grid.copy()
+        background_ignore_transition = self.background_ignore_transition.copy()
+        to_force_equal = self.merge_redundant_transitions(
+            background_grid, background_ignore_transition, parents_dict, background_grid)
+        self.background_grid = background_grid
+        self.background_ignore_transition = background_ignore_transition
         self.force_equal(to_force_equal)
-        to_force_equal = []
-        for t, generation in enumerate(self.grid):
-            if t > 0:
-                for y, row in enumerate(generation):
-                    for x, cell in enumerate(row):
-                        predecessor_cell = self.grid[t - 1][y][x]
-                        neighbours = neighbours_from_coordinates(self.grid, x, y, t,
-                                                                 background_grid=self.background_grid)
-
-                        if not self.ignore_transition[t][y][x]:
-                            parents = [predecessor_cell] + list(src.rules.sort_neighbours(neighbours))
-                            parents_string = str(parents)
-                            if parents_string in parents_dict:
-                                self.grid[t][y][x] = parents_dict[parents_string]
-                                to_force_equal.append((parents_dict[parents_string], cell))
-                                self.ignore_transition[t][y][x] = True
-                            elif all(parent in [-1, 1] for parent in parents):
-                                bs_letter = ["B", "S"][[-1, 1].index(predecessor_cell)]
-                                transition = src.rules.transition_from_cells(neighbours)
-                                child = self.rule[bs_letter + transition]
-                                if cell not in [-1, 1]:
-                                    self.grid[t][y][x] = child
-                                to_force_equal.append((cell, child))
-                                self.ignore_transition[t][y][x] = True
-                                parents_dict[parents_string] = self.grid[t][y][x]
-                            else:
-                                parents_dict[parents_string] = cell
+
+        grid = self.grid.copy()
+        ignore_transition = self.ignore_transition.copy()
+        to_force_equal = self.merge_redundant_transitions(
+            grid, ignore_transition, parents_dict, self.background_grid, first_generation=1)
+        self.grid = grid
+        self.ignore_transition = ignore_transition
         self.force_equal(to_force_equal)
         log("Done\n", -1)
 
-    def force_transition(self, grid, x, y, t, method):
+    def merge_redundant_transitions(self, grid, ignore_transition, parents_dict, background_grid, first_generation=0):
+        """Finds the cells of grid whose transitions are redundant, modifying grid and ignore_transition in place
+
+        A cell whose neighbourhood has been seen before is replaced by the cell that neighbourhood led to, and a cell
+        whose neighbourhood is constant is replaced by its child. Returns the pairs of literals that must be equal."""
+
+        transition_table = np.array(src.rules.transition_table(self.rule), dtype=np.int32)
+        duration, height, width = grid.shape
+        background_duration, background_height, background_width = background_grid.shape
+        # Rows and columns of the background that surround the grid
+        outer_rows = np.arange(-1, height + 1) % background_height
+        outer_columns = np.arange(-1, width + 1) % background_width
+
+        to_force_equal = []
+        for t in range(first_generation, duration):
+            # The previous generation, surrounded by the background
+            extended = background_grid[(t - 1) % background_duration][np.ix_(outer_rows, outer_columns)]
+            extended[1:-1, 1:-1] = grid[t - 1]
+            predecessor_cells = grid[t - 1].ravel()
+            neighbours = np.stack(
+                [extended[1 + y_offset:1 + y_offset + height, 1 + x_offset:1 + x_offset + width].ravel()
+                 for x_offset, y_offset in [(1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)]],
+                axis=1)
+
+            keys = np.column_stack([predecessor_cells, src.rules.sort_neighbours_array(neighbours)]).tolist()
+            constant = ((np.abs(predecessor_cells) == 1) & np.all(np.abs(neighbours) == 1, axis=1)).tolist()
+            children = transition_table[src.rules.neighbourhood_index_array(predecessor_cells, neighbours)].tolist()
+
+            generation = grid[t].ravel().tolist()
+            ignore_generation = ignore_transition[t].ravel()
+            for i in np.flatnonzero(~ignore_generation).tolist():
+                key = tuple(keys[i])
+                cell = generation[i]
+                if key in parents_dict:
+                    generation[i] = parents_dict[key]
+                    to_force_equal.append((parents_dict[key], cell))
+                    ignore_generation[i] = True
+                elif constant[i]:
+                    child = children[i]
+                    if cell not in [-1, 1]:
+                        generation[i] = child
+                    to_force_equal.append((cell, child))
+                    ignore_generation[i] = True
+                    parents_dict[key] = generation[i]
+                else:
+                    parents_dict[key] = cell
+            grid[t] = np.array(generation, dtype=grid.dtype).reshape(height, width)
+            ignore_transition[t] = ignore_generation.reshape(height, width)
+
+        return to_force_equal
+
+    def force_transition(self, grid, x, y, t, method, background_grid):
         cell = grid[t][y][x]
         duration = len(grid)
         if method == 0:
-            src.taocp_variable_scheme.transition_rule(self, grid, x, y, t)
+            src.taocp_variable_scheme.transition_rule(self, grid, x, y, t, background_grid)
 
         elif method == 1:
             predecessor_cell = grid[(t - 1) % duration][y][x]
-            neighbours = neighbours_from_coordinates(grid, x, y, t, background_grid=self.background_grid)
+            neighbours = neighbours_from_coordinates(grid, x, y, t, background_grid=background_grid)
 
             # If any four neighbours were live, then the cell is
             # dead
@@ -288,34 +320,33 @@ class SearchPattern:
         elif method == 2:
 
             predecessor_cell = grid[(t - 1) % duration][y][x]
-            neighbours = neighbours_from_coordinates(self.grid, x, y, t, background_grid=self.background_grid)
-
-            states = [-1, 1]
+            neighbours = neighbours_from_coordinates(grid, x, y, t, background_grid=background_grid)
+            parents = [predecessor_cell] + neighbours
 
             # For each combination of neighbourhoods
-            for predecessor_cell_alive in states:
-                for neighbours_alive in itertools.product(states, repeat=8):
-                    p = "S" if predecessor_cell_alive == 1 else "B"
-                    transition = src.rules.transition_from_cells(neighbours_alive)
-                    transition_literal = self.rule[p + transition]
-
-                    self.clauses.append(implies(
-                        [transition_literal] + [predecessor_cell * predecessor_cell_alive] +
-                        [neighbours[i] * neighbours_alive[i] for i in range(8)], cell))
-                    self.clauses.append(implies(
-                        [-transition_literal] + [predecessor_cell * predecessor_cell_alive] +
-                        [neighbours[i] * neighbours_alive[i] for i in range(8)], -cell))
+            for transition_literal, states in zip(
+                    src.rules.transition_table(self.rule), src.rules.neighbourhood_states):
+                antecedents = [parent * state for parent, state in zip(parents, states)]
+                self.clauses.append(implies([transition_literal] + antecedents, cell))
+                self.clauses.append(implies([-transition_literal] + antecedents, -cell))
+
+        elif method == 3:
+            src.minimized_truth_table.transition_rule(self, grid, x, y, t, background_grid)
 
+    @profiled("force_evolution")
     def force_evolution(self, method=None):
         """Adds clauses that force the search pattern to obey the transition rule"""
 
         # Methods:
         # 0. An implementation of the scheme Knuth describes in TAOCP Volume 4, Fascicle 6, solution to exercise 65b
-        # (57 clauses and 13 auxiliary variables per cell)
+        # (57 clauses and 13 auxiliary variables per cell for Life). Other rules are decoded from the neighbour counts,
+        # with extra clauses telling the isotropic letters apart for counts where they matter
         # 1. An implementation of the naive scheme Knuth gives in the solution to exercise 65a
         # (190 clauses and 0 auxiliary variables per cell)
         # 2. A very naive scheme just listing all possible predecessor neighbourhoods
-        # (512 clauses and 0 auxiliary variables per cell)
+        # (1024 clauses and 0 auxiliary variables per cell)
+        # 3. The prime implicants of the rule's truth table, chosen to cover it with as few clauses as possible
+        # (190 clauses for Life, and usually a few hundred otherwise, with 0 auxiliary variables per cell)
 
         log("Enforcing evolution rule...", 1)
 
@@ -323,31 +354,27 @@ class SearchPattern:
             if src.rules.rulestring_from_rule(self.rule) == "B3/S23":
                 method = settings.life_encoding_method
             else:
-                method = 2  # Default method
-        assert method in range(3), "Method not found"
-        assert method == 2 or src.rules.rulestring_from_rule(
-            self.rule) == "B3/S23", "Rules other than Life can only use method 2"
+                method = 3  # Default method
+        assert method in range(4), "Method not found"
+        assert method != 1 or src.rules.rulestring_from_rule(
+            self.rule) == "B3/S23", "Rules other than Life can't use method 1"
 
         log("Method: " + str(method))
         starting_number_of_clauses = len(self.clauses)
+        grid = self.grid.tolist()
+        background_grid = self.background_grid.tolist()
         # Iterate over all cells not in the first generation
-        for t, generation in enumerate(self.grid):
-            if t > 0:
-                for y, row in enumerate(generation):
-                    for x, cell in enumerate(row):
-                        if not self.ignore_transition[t][y][x]:
-                            self.force_transition(self.grid, x, y, t, method)
+        for t, y, x in zip(*np.nonzero(~self.ignore_transition[1:])):
+            self.force_transition(grid, int(x), int(y), int(t) + 1, method, background_grid)
 
         # Iterate over all background cells
-        for t, generation in enumerate(self.background_grid):
-            for y, row in enumerate(generation):
-                for x, cell in enumerate(row):
-                    if not self.background_ignore_transition[t][y][x]:
-                        self.force_transition(self.background_grid, x, y, t, method)
+        for t, y, x in zip(*np.nonzero(~self.background_ignore_transition)):
+            self.force_transition(background_grid, int(x), int(y), int(t), method, background_grid)
 
         log("Number of clauses used: " + str(len(self.clauses) - starting_number_of_clauses))
         log("Done\n", -1)
 
+    @profiled("force_change")
     def force_change(self, times):
         """Adds clauses forcing at least one cell to change between specified generations"""
 
@@ -356,156 +383,299 @@ class SearchPattern:
 
         starting_number_of_clauses = len(self.clauses)
 
-        width = len(self.grid[0][0])
-        height = len(self.grid[0])
-
-        self.force_unequal([(self.grid[t_0][y][x], self.grid[t_1][y][x]) for x in range(width) for y in range(height)])
+        self.force_unequal(list(zip(self.grid[t_0].T.ravel().tolist(), self.grid[t_1].T.ravel().tolist())))
 
         log("Number of clauses used: " + str(len(self.clauses) - starting_number_of_clauses))
         log("Done\n", -1)
 
-    def force_distinct(self, solution, determined=False):
-        """Force search_pattern to have at least one difference from given solution"""
+    @profiled("force_distinct")
+    def force_distinct(self, solution, shrink=None):
+        """Force search_pattern to have at least one difference from given solution
+
+        The blocking clause is the solution projected onto the decision variables that aren't fixed. If shrink is
+        given, it's called with those literals once that clause has been added, and gives a subset of them that no
+        other solution agrees with (such as a minimal core from an incremental solver). A second clause blocks just
+        that subset: it also rules out assignments that only differ from the solution where the rest of the clauses
+        are broken anyway, so it's stronger without losing any solution."""
 
         log("Forcing pattern to be different from solution...", 1)
 
-        variables = set()
+        # Solutions that agree on the decision variables agree everywhere, and variables fixed by unit clauses agree
+        # in every solution, so the blocking clause only needs the decision variables that aren't fixed
+        variables = self.decision_variables()
+        variables.difference_update(abs(literal) for literal in self.clauses.unit_literals())
+        literals = [literal for literal in solution if abs(literal) in variables]
+        self.clauses.append([-literal for literal in literals])
+
+        number_of_clauses = 1
+        if shrink is not None and literals:
+            core = shrink(literals)
+            log("Blocking clause shrunk from " + str(len(literals)) + " to " + str(len(core)) + " literals")
+            if len(core) < len(literals):
+                self.clauses.append([-literal for literal in core])
+                number_of_clauses += 1
+
+        log("Number of clauses used: " + str(number_of_clauses))
+        log("Done\n", -1)
 
-        for t, generation in enumerate(self.grid):
-            if t == 0 or not determined:
-                for row in generation:
-                    for cell in row:
-                        variables.add(abs(cell))
+    @profiled("force_distinct_object")
+    def force_distinct_object(self, solution):
+        """Force the first generation to differ from every phase of the solution, in every orientation and position
+
+        This needs the background to be the same constant everywhere in each generation, and everything else to be
+        determined by the first generation and the rule. Otherwise only the solution itself is blocked."""
+
+        duration, height, width = self.grid.shape
+        rule_variables = set(abs(literal) for literal in self.rule.values())
+        rule_variables.discard(1)
+        determining_variables = set(np.abs(self.grid[0]).ravel().tolist()) | rule_variables
+        background = self.background_grid.reshape(len(self.background_grid), -1)
+        if (
+                np.any(np.abs(background) != 1)
+                or np.any(background != background[:, :1])
+                or not self.decision_variables() <= determining_variables
+        ):
+            self.force_distinct(solution)
+            return
+
+        log("Forcing pattern to be different from every phase, orientation and position of solution...", 1)
+        starting_number_of_clauses = len(self.clauses)
 
-        for generation in self.background_grid:
-            for row in generation:
-                for cell in row:
-                    variables.add(abs(cell))
+        # The cells that differ from the background, in each generation
+        background_alive = background[np.arange(duration) % len(background), 0] == 1
+        alive = np.isin(self.grid, list(solution))
+        patterns = alive != background_alive[:, None, None]
+
+        # Every placement of every phase, rotation and reflection, as the cells that differ from the background
+        images = set()
+        for pattern in patterns:
+            ys, xs = np.nonzero(pattern)
+            if len(ys) == 0:
+                images.add(frozenset())
+                continue
+            box = pattern[ys.min():ys.max() + 1, xs.min():xs.max() + 1]
+            for orientation in [np.rot90(flipped, k) for flipped in [box, box[:, ::-1]] for k in range(4)]:
+                orientation_height, orientation_width = orientation.shape
+                cell_ys, cell_xs = np.nonzero(orientation)
+                for y in range(height - orientation_height + 1):
+                    for x in range(width - orientation_width + 1):
+                        images.add(frozenset(zip((cell_ys + y).tolist(), (cell_xs + x).tolist())))
+
+        # Solutions with the same values of the rule variables are the same object
+        rule_clause = [-literal for literal in solution if abs(literal) in rule_variables]
+        first_generation = self.grid[0]
+        constant = np.abs(first_generation) == 1
+        for image in images:
+            desired = np.full((height, width), background_alive[0])
+            for y, x in image:
+                desired[y, x] = not background_alive[0]
+            # Skip the placements that disagree with the cells that are fixed, or with cells that share a variable
+            if np.any((first_generation[constant] == 1) != desired[constant]):
+                continue
+            clause = set(np.where(desired, -first_generation, first_generation)[~constant].tolist())
+            if any(-literal in clause for literal in clause):
+                continue
+            self.clauses.append(sorted(clause, key=abs) + rule_clause)
+        log("Number of clauses used: " + str(len(self.clauses) - starting_number_of_clauses))
+        log("Done\n", -1)
 
-        for literal in self.rule.values():
-            variables.add(abs(literal))
+    def decision_variables(self):
+        """The variables that the rest of the search pattern is a function of
+
+        These are the rule variables, the background variables, the generation 0 variables and any variable in a later
+        generation that can't be worked out from the generation before."""
+
+        variables = set(np.abs(self.grid[0]).ravel().tolist())
+        variables.update(np.abs(self.background_grid).ravel().tolist())
+        variables.update(abs(literal) for literal in self.rule.values())
+
+        known = np.zeros(self.number_of_variables + 1, dtype=bool)
+        known[1] = True
+        known[list(variables)] = True
+        height, width = self.grid.shape[1:]
+        for t in range(1, len(self.grid)):
+            # Neighbours outside the grid are background cells, which are always known
+            predecessors_known = np.pad(known[np.abs(self.grid[t - 1])], 1, constant_values=True)
+            derivable = ~self.ignore_transition[t]
+            for y_offset in range(3):
+                for x_offset in range(3):
+                    derivable &= predecessors_known[y_offset:y_offset + height, x_offset:x_offset + width]
+            generation = np.abs(self.grid[t])
+            known[generation[derivable]] = True
+            undetermined = generation[~known[generation]]
+            variables.update(undetermined.tolist())
+            known[undetermined] = True
+
+        return variables
+
+    def output_variables(self):
+        """The variables the output is made from: those of the grid, the background and the rule"""
+
+        variables = set(np.abs(self.grid).ravel().tolist())
+        variables.update(np.abs(self.background_grid).ravel().tolist())
+        variables.update(abs(literal) for literal in self.rule.values())
+        return variables
+
+    def splitting_variables(self, number):
+        """Chooses generation 0 variables to split the search on, for cube and conquer
+
+        The variables are taken from a band of rows through the middle of the pattern, wide enough to hold twice as
+        many as are needed, and within it the variables with the highest Jeroslow-Wang scores are chosen."""
+
+        fixed = set(abs(literal) for literal in self.clauses.unit_literals())
+        scores = self.clauses.variable_scores(self.number_of_variables)
+        generation = np.abs(self.grid[0, 1:-1, 1:-1])
+        height = generation.shape[0]
+
+        band = []
+        for y in sorted(range(height), key=lambda y: (abs(2 * y - (height - 1)), y)):
+            for variable in generation[y].tolist():
+                if variable not in fixed and variable not in band:
+                    band.append(variable)
+            if len(band) >= 2 * number:
+                break
 
-        self.clauses.append([-literal for literal in solution if abs(literal) in variables])
-        log("Number of clauses used: 1")
-        log("Done\n", -1)
+        band.sort(key=lambda variable: -scores[variable])
+        return band[:number]
 
-    def get_cardinality_variable(self, literals, at_least):
-        if (literals, at_least) not in self.cardinality_variables:
-            self.number_of_variables += 1
-            self.cardinality_variables[(literals, at_least)] = self.number_of_variables
-        return self.cardinality_variables[(literals, at_least)]
+    def cardinality_node(self, literals):
+        """Gives the id of the node of the totalizer tree counting the literals
 
-    def define_cardinality_variable(self, literals, at_least, preprocessing=True):
-        """Generates clauses defining a cardinality variable"""
+        Nodes are hash-consed on the ids of their halves, so equal tuples of literals give the same node"""
 
-        if preprocessing:
-            at_least -= literals.count(1)
-            literals = tuple(sorted(literal for literal in literals if abs(literal) != 1))
-        name = self.get_cardinality_variable(literals, at_least)
+        ids = dict()  # The node for each range of the literals
+        stack = [(0, len(literals))]
+        while stack:
+            start, end = stack[-1]
+            if end - start <= 1:
+                key = literals[start:end]
+            else:
+                middle = start + (end - start) // 2
+                if (start, middle) not in ids or (middle, end) not in ids:
+                    stack.append((middle, end))
+                    stack.append((start, middle))
+                    continue
+                key = (ids[(start, middle)], ids[(middle, end)])
+            stack.pop()
+            if key not in self.cardinality_node_ids:
+                self.cardinality_node_ids[key] = len(self.cardinality_nodes)
+                if end - start <= 1:
+                    self.cardinality_nodes.append((end - start, key, None))
+                else:
+                    self.cardinality_nodes.append((end - start,) + key)
+            ids[(start, end)] = self.cardinality_node_ids[key]
+        return ids[(0, len(literals))]
 
-        if (literals, at_least) not in self.defined_cardinality_variables:
-            self.defined_cardinality_variables.add((literals, at_least))
+    def get_cardinality_variable(self, node, at_least):
+        if (node, at_least) not in self.cardinality_variables:
+            self.number_of_variables += 1
+            self.cardinality_variables[(node, at_least)] = self.number_of_variables
+        return self.cardinality_variables[(node, at_least)]
+
+    def define_cardinality_variable(self, literals, at_least):
+        """Generates clauses defining a variable saying that at least at_least of the literals are true"""
+
+        at_least -= literals.count(1)
+        literals = tuple(sorted(literal for literal in literals if abs(literal) != 1))
+        root = self.cardinality_node(literals)
+        name = self.get_cardinality_variable(root, at_least)
+
+        # Define the variables depth first, with a stack rather than recursion
+        stack = [(root, at_least)]
+        while stack:
+            node, at_least = stack.pop()
+            if (node, at_least) in self.defined_cardinality_variables:
+                continue
+            self.defined_cardinality_variables.add((node, at_least))
+            variable = self.get_cardinality_variable(node, at_least)
 
-            max_literals = len(literals)  # The most literals that could be true
-            max_literals_1 = max_literals // 2
-            literals_1 = literals[:max_literals_1]
+            max_literals, node_1, node_2 = self.cardinality_nodes[node]  # The most literals that could be true
             variables_to_define_1 = []  # A list of variables we need to define
-            max_literals_2 = max_literals - max_literals_1
-            literals_2 = literals[max_literals_1:]
             variables_to_define_2 = []  # A list of variables we need to define
 
             # If at_least is obviously too small or too big, give the obvious answer
             if at_least <= 0:
-                self.clauses.append([name])
+                self.clauses.append([variable])
             elif at_least > max_literals:
-                self.clauses.append([-name])
+                self.clauses.append([-variable])
             elif max_literals == 1:
-                literal = literals[0]
-                self.clauses.append([-name, literal])
-                self.clauses.append([name, -literal])
+                literal = node_1[0]
+                self.clauses.append([-variable, literal])
+                self.clauses.append([variable, -literal])
 
             # Otherwise define the appropriate clauses
             else:
+                max_literals_1 = self.cardinality_nodes[node_1][0]
+                max_literals_2 = self.cardinality_nodes[node_2][0]
                 if at_least <= max_literals_1:
                     self.clauses.append(
                         implies(
-                            self.get_cardinality_variable(literals_1, at_least),
-                            name))
+                            self.get_cardinality_variable(node_1, at_least),
+                            variable))
                     variables_to_define_1.append(at_least)
                 for j in range(1, max_literals_2 + 1):
-                    for i in range(1, max_literals_1 + 1):
-                        if i + j == at_least:
-                            self.clauses.append(
-                                implies(
-                                    [self.get_cardinality_variable(literals_1, i),
-                                     self.get_cardinality_variable(literals_2, j)],
-                                    name))
-                            variables_to_define_1.append(i)
-                            variables_to_define_2.append(j)
+                    i = at_least - j
+                    if 1 <= i <= max_literals_1:
+                        self.clauses.append(
+                            implies(
+                                [self.get_cardinality_variable(node_1, i),
+                                 self.get_cardinality_variable(node_2, j)],
+                                variable))
+                        variables_to_define_1.append(i)
+                        variables_to_define_2.append(j)
                 if at_least <= max_literals_2:
                     self.clauses.append(
                         implies(
-                            self.get_cardinality_variable(literals_2, at_least),
-                            name))
+                            self.get_cardinality_variable(node_2, at_least),
+                            variable))
                     variables_to_define_2.append(at_least)
 
                 if at_least > max_literals_2:
                     i = at_least - max_literals_2
                     self.clauses.append(
                         implies(
-                            -self.get_cardinality_variable(literals_1, i),
-                            -name))
+                            -self.get_cardinality_variable(node_1, i),
+                            -variable))
                     variables_to_define_1.append(i)
                 for j in range(1, max_literals_2 + 1):
-                    for i in range(1, max_literals_1 + 1):
-                        if i + j == at_least + 1:
-                            self.clauses.append(implies([
-                                -self.get_cardinality_variable(literals_1, i),
-                                -self.get_cardinality_variable(literals_2, j)],
-                                -name))
-                            variables_to_define_1.append(i)
-                            variables_to_define_2.append(j)
+                    i = at_least + 1 - j
+                    if 1 <= i <= max_literals_1:
+                        self.clauses.append(implies([
+                            -self.get_cardinality_variable(node_1, i),
+                            -self.get_cardinality_variable(node_2, j)],
+                            -variable))
+                        variables_to_define_1.append(i)
+                        variables_to_define_2.append(j)
                 if at_least > max_literals_1:
                     j = at_least - max_literals_1
                     self.clauses.append(
                         implies(
-                            -self.get_cardinality_variable(literals_2, j),
-                            -name))
+                            -self.get_cardinality_variable(node_2, j),
+                            -variable))
                     variables_to_define_2.append(j)
 
-            # Remove duplicates from our lists of child variables we need to define
-            variables_to_define_1 = set(variables_to_define_1)
-            variables_to_define_2 = set(variables_to_define_2)
-
-            # Define the child variables
-            for at_least_1 in variables_to_define_1:
-                self.define_cardinality_variable(literals_1, at_least_1, preprocessing=False)
-            for at_least_2 in variables_to_define_2:
-                self.define_cardinality_variable(literals_2, at_least_2, preprocessing=False)
+            # Remove duplicates from our lists of child variables we need to define, and push them so that they're
+            # popped in the same order the recursive definition used to visit them
+            stack.extend(reversed(
+                [(node_2, at_least_2) for at_least_2 in set(variables_to_define_2)]))
+            stack.extend(reversed(
+                [(node_1, at_least_1) for at_least_1 in set(variables_to_define_1)]))
         return name
 
+    @profiled("force_symmetry")
     def force_symmetry(self, symmetry):
         to_force_equal = self.cell_pairs_from_transformation(symmetry)
         self.force_equal(to_force_equal)
 
+    @profiled("force_asymmetry")
     def force_asymmetry(self, asymmetry):
         to_force_unequal = self.cell_pairs_from_transformation(asymmetry)
         self.force_unequal(to_force_unequal)
 
-    def cell_pairs_from_transformation(self, symmetry):
-        (
-            transformation,
-            x_translate,
-            y_translate,
-            period
-        ) = symmetry
-        transformation = transformation.upper()
-        width = len(self.grid[0][0])
-        height = len(self.grid[0])
-        duration = len(self.grid)
-        background_width = len(self.background_grid[0][0])
-        background_height = len(self.background_grid[0])
-        background_duration = len(self.background_grid)
+    def coordinate_maps(self, transformation, x_translate=0, y_translate=0):
+        """The map of coordinates that a transformation makes, and its inverse"""
+
+        _, height, width = self.grid.shape
 
         transformations = {
             "RO0": (
@@ -541,201 +711,319 @@ class SearchPattern:
                 lambda x, y: ((height - 1) - (y - y_translate), (height - 1) - (x - x_translate))
             )
         }
+        return transformations[transformation.upper()]
 
-        f, f_inv = transformations[transformation]
+    def cell_pairs_from_transformation(self, symmetry):
+        (
+            transformation,
+            x_translate,
+            y_translate,
+            period
+        ) = symmetry
+        duration, height, width = self.grid.shape
+        background_duration, background_height, background_width = self.background_grid.shape
+        grid = self.grid.tolist()
+        background_grid = self.background_grid.tolist()
+
+        f, f_inv = self.coordinate_maps(transformation, x_translate, y_translate)
 
         cell_pairs = []
 
         for x_0 in range(width):
             for y_0 in range(height):
                 for t in range(duration):
-                    cell_0 = self.grid[t][y_0][x_0]
+                    cell_0 = grid[t][y_0][x_0]
                     if t < duration - period:
                         x_1, y_1 = f(x_0, y_0)
                         if 0 <= x_1 < width and 0 <= y_1 < height:
-                            other_cell = self.grid[t + period][y_1][x_1]
+                            other_cell = grid[t + period][y_1][x_1]
                         else:
                             other_cell = \
-                                self.background_grid[(t + period) % background_duration][y_1 % background_height][
+                                background_grid[(t + period) % background_duration][y_1 % background_height][
                                     x_1 % background_width]
                         cell_pairs.append((cell_0, other_cell))
                     if t >= period:
                         x_1, y_1 = f_inv(x_0, y_0)
                         if 0 <= x_1 < width and 0 <= y_1 < height:
-                            other_cell = self.grid[t - period][y_1][x_1]
+                            other_cell = grid[t - period][y_1][x_1]
                         else:
                             other_cell = \
-                                self.background_grid[(t - period) % background_duration][y_1 % background_height][
+                                background_grid[(t - period) % background_duration][y_1 % background_height][
                                     x_1 % background_width]
                         cell_pairs.append((cell_0, other_cell))
         return cell_pairs
 
-    def force_at_least(self, literals, amount):
+    def allowed_symmetries(self):
+        """The transformations (other than the identity) that map the search pattern onto itself
+
+        A transformation is allowed if it maps the grid, and the ring of background cells around it, onto itself, with
+        each cell going to one that's ignored in the same way and is the same constant, or a variable that every other
+        cell with its variable also goes to. The background mustn't contain variables, as its own evolution is only
+        encoded on the torus."""
+
+        if np.any(np.abs(self.background_grid) != 1):
+            return []
+        duration, height, width = self.grid.shape
+        background_duration, background_height, background_width = self.background_grid.shape
+        grid = self.grid.tolist()
+        ignore_transition = self.ignore_transition.tolist()
+        background_grid = self.background_grid.tolist()
+        background_ignore_transition = self.background_ignore_transition.tolist()
+
+        def cell(t, x, y):
+            """The literal of a cell, and whether its transition is ignored"""
+            if 0 <= x < width and 0 <= y < height:
+                return grid[t][y][x], ignore_transition[t][y][x]
+            t, x, y = t % background_duration, x % background_width, y % background_height
+            return background_grid[t][y][x], background_ignore_transition[t][y][x]
+
+        allowed = []
+        for transformation in ["RO1", "RO2", "RO3", "RE-", "RE\\", "RE|", "RE/"]:
+            f, _ = self.coordinate_maps(transformation)
+            images = dict()  # The literal each variable goes to
+            for t, y, x in itertools.product(range(duration), range(-1, height + 1), range(-1, width + 1)):
+                x_1, y_1 = f(x, y)
+                if not (-1 <= x_1 <= width and -1 <= y_1 <= height):
+                    break
+                (literal, ignored), (image, image_ignored) = cell(t, x, y), cell(t, x_1, y_1)
+                if ignored != image_ignored:
+                    break
+                if abs(literal) == 1 or abs(image) == 1:
+                    if literal != image:
+                        break
+                elif images.setdefault(abs(literal), image if literal > 0 else -image) != (
+                        image if literal > 0 else -image):
+                    break
+            else:
+                if set(abs(image) for image in images.values()) == set(images):
+                    allowed.append(transformation)
+        return allowed
+
+    @profiled("force_lex_leader")
+    def force_lex_leader(self, transformation):
+        """Adds clauses forcing the first generation to come no later than its image in lexicographic order
+
+        The order reads the cells row by row, with dead before alive. Of a solution and its images under the allowed
+        symmetries, the one that comes first satisfies these clauses for each of them."""
+
+        log("Forcing the first generation to come before its image under " + transformation, 1)
+        starting_number_of_clauses = len(self.clauses)
+        _, height, width = self.grid.shape
+        generation = self.grid[0].tolist()
+        f, _ = self.coordinate_maps(transformation)
+
+        pairs = []
+        for y in range(height):
+            for x in range(width):
+                x_1, y_1 = f(x, y)
+                if generation[y][x] != generation[y_1][x_1]:
+                    pairs.append((generation[y][x], generation[y_1][x_1]))
+
+        equal_so_far = []  # A literal implied by every earlier cell being the same as its image
+        for i, (literal, image) in enumerate(pairs):
+            self.clauses.append(implies(equal_so_far + [literal], image))
+            if i < len(pairs) - 1:
+                self.number_of_variables += 1
+                next_equal_so_far = self.number_of_variables
+                self.clauses.append(implies(equal_so_far + [literal], next_equal_so_far))
+                self.clauses.append(implies(equal_so_far + [-image], next_equal_so_far))
+                equal_so_far = [next_equal_so_far]
+        log("Number of clauses used: " + str(len(self.clauses) - starting_number_of_clauses))
+        log("Done\n", -1)
+
+    def force_at_least(self, literals, amount, encoding=None):
         """Adds clauses forcing at least the given amount of literals to be true"""
 
+        if encoding is None:
+            encoding = settings.cardinality_encoding
         starting_number_of_clauses = len(self.clauses)
-        name = self.define_cardinality_variable(literals, amount)
-        self.clauses.append([name])
+        if encoding == "totalizer":
+            name = self.define_cardinality_variable(literals, amount)
+            self.clauses.append([name])
+        else:
+            src.cardinality.force_at_most(self, [-literal for literal in literals], len(literals) - amount, encoding)
         log("Number of clauses used: " + str(len(self.clauses) - starting_number_of_clauses))
 
-    def force_at_most(self, literals, amount):
+    def force_at_most(self, literals, amount, encoding=None):
         """Adds clauses forcing at most the given amount of literals to be true"""
 
-        self.force_at_least([-literal for literal in literals], len(literals) - amount)
+        self.force_at_least([-literal for literal in literals], len(literals) - amount, encoding)
 
-    def force_exactly(self, literals, amount):
+    def force_exactly(self, literals, amount, encoding=None):
         """Adds clauses forcing exactly the given amount of literals to be true"""
 
-        self.force_at_least(literals, amount)
-        self.force_at_most(literals, amount)
+        self.force_at_least(literals, amount, encoding)
+        self.force_at_most(literals, amount, encoding)
 
+    @profiled("force_population_at_least")
     def force_population_at_least(self, constraint):
-        (times, population) = constraint
+        (times, population, *encoding) = constraint
         log("Forcing the population in generation" + ("s" if len(times) > 1 else "") + " " + ", ".join(
             str(t) for t in times) + " to be at least " + str(population), 1)
-        literals = [cell for t in times for row in self.grid[t] for cell in row]
-        self.force_at_least(literals, population)
+        literals = self.grid[times].ravel().tolist()
+        self.force_at_least(literals, population, *encoding)
         log("Done\n", -1)
 
+    @profiled("force_population_at_most")
     def force_population_at_most(self, constraint):
-        (times, population) = constraint
+        (times, population, *encoding) = constraint
         log("Forcing the population in generation" + ("s" if len(times) > 1 else "") + " " + ", ".join(
             str(t) for t in times) + " to be at most " + str(population), 1)
-        literals = [cell for t in times for row in self.grid[t] for cell in row]
-        self.force_at_most(literals, population)
+        literals = self.grid[times].ravel().tolist()
+        self.force_at_most(literals, population, *encoding)
         log("Done\n", -1)
 
+    @profiled("force_population_exactly")
     def force_population_exactly(self, constraint):
-        (times, population) = constraint
+        (times, population, *encoding) = constraint
         log("Forcing the population in generation" + ("s" if len(times) > 1 else "") + " " + ", ".join(
             str(t) for t in times) + " to be exactly " + str(population), 1)
-        literals = [cell for t in times for row in self.grid[t] for cell in row]
-        self.force_exactly(literals, population)
+        literals = self.grid[times].ravel().tolist()
+        self.force_exactly(literals, population, *encoding)
+        log("Done\n", -1)
+
+    def population(self, times, solution):
+        """The population of a solution in the given generations, summed"""
+        return sum(literal in solution for literal in self.grid[times].ravel().tolist())
+
+    @profiled("force_population_below")
+    def force_population_below(self, times, population):
+        """Adds a unit clause forcing the population in the given generations to be less than before
+
+        The bound is a variable of the totalizer tree over those generations' cells, which is only built the first
+        time. Later, tighter bounds reuse its nodes and only define the variables they need."""
+
+        log("Forcing the population in generation" + ("s" if len(times) > 1 else "") + " " + ", ".join(
+            str(t) for t in times) + " to be less than " + str(population), 1)
+        starting_number_of_clauses = len(self.clauses)
+        literals = self.grid[times].ravel().tolist()
+        self.clauses.append([-self.define_cardinality_variable(literals, population)])
+        log("Number of clauses used: " + str(len(self.clauses) - starting_number_of_clauses))
         log("Done\n", -1)
 
-    def force_max_change(self, max_change):
+    @profiled("force_max_change")
+    def force_max_change(self, max_change, encoding=None):
         log("Forcing the pattern to never change by more than " + str(max_change) + " cells", 1)
-        width = len(self.grid[0][0])
-        height = len(self.grid[0])
-        duration = len(self.grid)
+        duration, height, width = self.grid.shape
+        grid = self.grid.tolist()
         for t in range(1, duration):
             literals = []
             for x in range(width):
                 for y in range(height):
                     self.number_of_variables += 1
                     literal = self.number_of_variables
-                    self.clauses.append(implies([self.grid[t][y][x], -self.grid[0][y][x]], literal))
-                    self.clauses.append(implies([-self.grid[t][y][x], self.grid[0][y][x]], literal))
+                    self.clauses.append(implies([grid[t][y][x], -grid[0][y][x]], literal))
+                    self.clauses.append(implies([-grid[t][y][x], grid[0][y][x]], literal))
                     literals.append(literal)
             log("Generation " + str(t))
-            self.force_at_most(literals, max_change)
+            self.force_at_most(literals, max_change, encoding)
         log("Done\n", -1)
 
-    def force_max_decay(self, max_decay):
+    @profiled("force_max_decay")
+    def force_max_decay(self, max_decay, encoding=None):
         log("Forcing the pattern to never decay by more than " + str(max_decay) + " cells", 1)
-        width = len(self.grid[0][0])
-        height = len(self.grid[0])
-        duration = len(self.grid)
+        duration, height, width = self.grid.shape
+        grid = self.grid.tolist()
         for t in range(1, duration):
             literals = []
             for x in range(width):
                 for y in range(height):
                     self.number_of_variables += 1
                     literal = self.number_of_variables
-                    self.clauses.append(implies([-self.grid[t][y][x], self.grid[0][y][x]], literal))
+                    self.clauses.append(implies([-grid[t][y][x], grid[0][y][x]], literal))
                     literals.append(literal)
             log("Generation " + str(t))
-            self.force_at_most(literals, max_decay)
+            self.force_at_most(literals, max_decay, encoding)
         log("Done\n", -1)
 
-    def force_max_growth(self, max_growth):
+    @profiled("force_max_growth")
+    def force_max_growth(self, max_growth, encoding=None):
         log("Forcing the pattern to never grow by more than " + str(max_growth) + " cells", 1)
-        width = len(self.grid[0][0])
-        height = len(self.grid[0])
-        duration = len(self.grid)
+        duration, height, width = self.grid.shape
+        grid = self.grid.tolist()
         for t in range(1, duration):
             literals = []
             for x in range(width):
                 for y in range(height):
                     self.number_of_variables += 1
                     literal = self.number_of_variables
-                    self.clauses.append(implies([self.grid[t][y][x], -self.grid[0][y][x]], literal))
+                    self.clauses.append(implies([grid[t][y][x], -grid[0][y][x]], literal))
                     literals.append(literal)
             log("Generation " + str(t))
-            self.force_at_most(literals, max_growth)
+            self.force_at_most(literals, max_growth, encoding)
         log("Done\n", -1)
 
     def force_equal(self, cell_pair_list):
-
-        replacement = {}
-        replaces = {}
-
+        """Substitutes literals so that each pair of cells is equal, raising UnsatInPreprocessing on a contradiction"""
+
+        # A signed union-find: each variable points to a parent, with a parity saying whether it's the negation of its
+        # parent. Variable 1 (the constant "true") is just another variable, so classes containing it become constants.
+        parent = list(range(self.number_of_variables + 1))
+        parity = [0] * (self.number_of_variables + 1)
+        rank = [0] * (self.number_of_variables + 1)
+
+        def find(variable):
+            """Finds the root of a variable's class, and whether the variable is the negation of the root"""
+            if parent[variable] == variable:
+                return variable, 0
+            path = []
+            while parent[variable] != variable:
+                path.append(variable)
+                variable = parent[variable]
+            root = variable
+            # Path compression, in order from the root down, so that the parities can be accumulated
+            root_parity = 0
+            for variable in reversed(path):
+                root_parity ^= parity[variable]
+                parity[variable] = root_parity
+                parent[variable] = root
+            return root, parity[path[0]]
+
+        merged = False
         for cell_0, cell_1 in cell_pair_list:
-            variable_0, negated_0 = variable_from_literal(cell_0)
-            variable_1, negated_1 = variable_from_literal(cell_1)
-            cell_0, cell_1 = max(variable_0,variable_1), min(variable_0,variable_1) * negated_0 * negated_1
-            while cell_0 not in [-1, 1]:
-                variable_0, negated_0 = variable_from_literal(cell_0)
-                if variable_0 in replacement:
-                    cell_0 = replacement[variable_0] * negated_0
-                else:
-                    break
-            while cell_1 not in [-1, 1]:
-                variable_1, negated_1 = variable_from_literal(cell_1)
-                if variable_1 in replacement:
-                    cell_1 = replacement[variable_1] * negated_1
-                else:
-                    break
-            if cell_0 != cell_1:
-                if cell_0 == -cell_1:
+            if cell_0 == cell_1:
+                continue
+            root_0, parity_0 = find(abs(cell_0))
+            root_1, parity_1 = find(abs(cell_1))
+            parity_0 ^= cell_0 < 0
+            parity_1 ^= cell_1 < 0
+            if root_0 == root_1:
+                if parity_0 != parity_1:
                     raise UnsatInPreprocessing
-                elif cell_0 in [-1, 1]:
-                    cell_0, cell_1 = cell_1, cell_0
-
-                variable_0, negated_0 = variable_from_literal(cell_0)
-                cell_0, cell_1 = variable_0, cell_1 * negated_0
-
-                if cell_1 not in [-1, 1]:
-                    variable_1, negated_1 = variable_from_literal(cell_1)
-                    if variable_1 not in replaces:
-                        replaces[variable_1] = []
-
-                if variable_0 in replaces:
-                    for variable in replaces[variable_0]:
-                        replacement_variable, replacement_negated = variable_from_literal(replacement[variable])
-                        replacement[variable] = cell_1 * replacement_negated
-                        if cell_1 not in [-1, 1]:
-                            replaces[variable_1].append(variable)
-                    del replaces[variable_0]
-
-                replacement[variable_0] = cell_1
-                if cell_1 not in [-1, 1]:
-                    replaces[variable_1].append(variable_0)
-
-        for t, generation in enumerate(self.grid):
-            for y, row in enumerate(generation):
-                for x, cell in enumerate(row):
-                    if cell not in [-1, 1]:
-                        variable, negated = variable_from_literal(cell)
-                        if variable in replacement:
-                            if replacement[variable] != variable:
-                                self.grid[t][y][x] = replacement[variable] * negated
-
-        for t, generation in enumerate(self.background_grid):
-            for y, row in enumerate(generation):
-                for x, cell in enumerate(row):
-                    if cell not in [-1, 1]:
-                        variable, negated = variable_from_literal(cell)
-                        if variable in replacement:
-                            if replacement[variable] != variable:
-                                self.background_grid[t][y][x] = replacement[variable] * negated
-
+                continue
+            # Union by rank
+            if rank[root_0] < rank[root_1]:
+                root_0, root_1 = root_1, root_0
+            elif rank[root_0] == rank[root_1]:
+                rank[root_0] += 1
+            parent[root_1] = root_0
+            parity[root_1] = parity_0 ^ parity_1
+            merged = True
+
+        if not merged:
+            return
+
+        # Resolve every variable to its root at once, by pointer jumping
+        parent = np.array(parent, dtype=np.int32)
+        parity = np.array(parity, dtype=np.int32)
+        while True:
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                break
+            parity ^= parity[parent]
+            parent = grandparent
+
+        # Each class is replaced by its smallest variable (so the constant, if it contains one)
+        variables = np.arange(self.number_of_variables + 1, dtype=np.int32)
+        representative = variables.copy()
+        np.minimum.at(representative, parent, variables)
+        representative = representative[parent]
+        substitution = representative * (1 - 2 * (parity ^ parity[representative]))
+
+        self.grid = substitution[np.abs(self.grid)] * np.sign(self.grid)
+        self.background_grid = substitution[np.abs(self.background_grid)] * np.sign(self.background_grid)
         for transition, literal in self.rule.items():
-            if literal not in [-1, 1]:
-                variable, negated = variable_from_literal(literal)
-                if variable in replacement:
-                    if replacement[variable] != variable:
-                        self.rule[transition] = replacement[variable] * negated
+            self.rule[transition] = int(substitution[abs(literal)]) * (1 if literal > 0 else -1)
 
     def force_unequal(self, cell_pair_list):
 
@@ -757,9 +1045,9 @@ class SearchPattern:
 
         assert pattern_output_format in ["rle", "csv", "blk"], "Format not recognised"
 
-        background_grid = copy.deepcopy(self.background_grid)
+        background_grid = self.background_grid.copy()
         src.literal_manipulation.offset_background(background_grid, -1, -1, 0)
-        background_ignore_transition = copy.deepcopy(self.background_ignore_transition)
+        background_ignore_transition = self.background_ignore_transition.copy()
         src.literal_manipulation.offset_background(background_ignore_transition, -1, -1, 0)
         if pattern_output_format == "rle":
             output_string = src.formatting.make_rle(
@@ -797,45 +1085,75 @@ class SearchPattern:
         return output_string
 
     def deterministic(self):
+        """Checks whether every cell is determined by the first generation
+
+        A cell is determined if it's constant, in the first generation, shares its variable with a determined cell, or
+        has its transition enforced and the cells at offsets 0 and 1 from it in the previous generation determined."""
+
         log("Checking if pattern is deterministic...", 1)
-        determined = make_grid(False, template=self.grid)
+        duration, height, width = self.grid.shape
+        area = height * width
+
+        # Work with flat indices into the grid
+        variables = np.abs(self.grid).ravel().tolist()
+        ignore_transition = self.ignore_transition.ravel().tolist()
+        cells_by_variable = collections.defaultdict(list)
+        for i, variable in enumerate(variables):
+            if variable != 1:
+                cells_by_variable[variable].append(i)
+        # How many of the cells that each cell depends on in the previous generation aren't yet known to be determined
+        y_range, x_range = np.ogrid[:height, :width]
+        undetermined_parents = np.broadcast_to(
+            (1 + (y_range < height - 1)) * (1 + (x_range < width - 1)), (duration, height, width)).ravel().tolist()
+
+        determined = bytearray(duration * area)
         determined_variables = set()
-        width = len(self.grid[0][0])
-        height = len(self.grid[0])
-
-        while True:
-            determined_copy = copy.deepcopy(determined)
-            for t, generation in enumerate(self.grid):
-                for y, row in enumerate(generation):
-                    for x, cell in enumerate(row):
-                        if not determined[t][y][x]:
-                            if cell in [-1, 1]:
-                                determined[t][y][x] = True
-                            else:
-                                variable, negated = variable_from_literal(cell)
-                                if t == 0:
-                                    determined[t][y][x] = True
-                                    determined_variables.add(variable)
-                                elif variable in determined_variables:
-                                    determined[t][y][x] = True
-                                elif all(determined[t - 1][y + y_offset][x + x_offset] for x_offset in range(2) for
-                                         y_offset in range(2) if
-                                         x + x_offset in range(width) and y + y_offset in range(height)) and not \
-                                        self.ignore_transition[t][y][x]:
-                                    determined[t][y][x] = True
-                                    determined_variables.add(variable)
-            if determined == determined_copy:
-                break
+        # Cells that have been found to be determined, whose consequences haven't been followed up yet
+        worklist = []
+
+        def determine_cell(i):
+            if not determined[i]:
+                determined[i] = True
+                worklist.append(i)
+
+        def determine_variable(variable):
+            if variable not in determined_variables:
+                determined_variables.add(variable)
+                for i in cells_by_variable[variable]:
+                    determine_cell(i)
+
+        for i, variable in enumerate(variables):
+            if variable == 1:
+                determine_cell(i)
+            elif i < area:
+                determine_cell(i)
+                determine_variable(variable)
+
+        while worklist:
+            i = worklist.pop()
+            if i + area >= duration * area:
+                continue
+            y, x = divmod(i % area, width)
+            # The cells in the next generation at offsets 0 and -1 depend on this one
+            children = [i + area]
+            if x > 0:
+                children.append(i + area - 1)
+            if y > 0:
+                children.append(i + area - width)
+                if x > 0:
+                    children.append(i + area - width - 1)
+            for child in children:
+                undetermined_parents[child] -= 1
+                if undetermined_parents[child] == 0 and not ignore_transition[child] and not determined[child]:
+                    determine_cell(child)
+                    determine_variable(variables[child])
 
         log("Done\n", -1)
-        if all(flag for generation in determined for row in generation for flag in row):
-            return True
-        else:
-            return False
+        return all(determined)
 
     def background_nontrivial(self):
         return (
-            len(self.background_grid[0]) > 1
-            and len(self.background_grid[0][0]) > 1
-            and any(cell not in [-1, 1] for generation in self.background_grid for row in generation for cell in row)
+            self.background_grid.shape[1] > 1
+            and self.background_grid.shape[2] > 1
+            and bool(np.any(np.abs(self.background_grid) != 1))
         )
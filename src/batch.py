@@ -0,0 +1,88 @@
+import argparse
+import json
+import multiprocessing
+import sys
+import time
+import src.logging
+from src.search import search
+from src.sat_solvers import Status
+
+
+def arguments_from_job(job):
+    """Converts a job from a manifest into command line arguments for a search
+
+    A job is a dictionary, which can have the keys "pattern" (a search pattern file) or "bounds" (the arguments to -b),
+    "rule", "symmetries", "asymmetries", "population", "force_change", "timeout", "number_of_solutions", "background",
+    "method" and "solver", as well as "arguments", a list of any other command line arguments."""
+
+    assert "pattern" in job or "bounds" in job, "Job needs a pattern or bounds"
+    arguments = ["-v", "0"]
+    if "pattern" in job:
+        arguments.append(job["pattern"])
+    if "bounds" in job:
+        arguments += ["-b"] + [str(bound) for bound in job["bounds"]]
+    if "rule" in job:
+        arguments += ["-r", job["rule"]]
+    for option, key in [("-s", "symmetries"), ("-a", "asymmetries"), ("-p", "population")]:
+        for value in job.get(key, []):
+            arguments += [option] + value.split()
+    for generations in job.get("force_change", []):
+        arguments += ["-c"] + [str(t) for t in generations]
+    if "number_of_solutions" in job:
+        number_of_solutions = job["number_of_solutions"]
+        arguments += ["-n"] + ([str(number_of_solutions)] if number_of_solutions is not None else [])
+    for option, key in [("-t", "timeout"), ("--background", "background"), ("-M", "method"), ("-S", "solver")]:
+        if key in job:
+            arguments += [option, str(job[key])]
+    return arguments + job.get("arguments", [])
+
+
+def run_job(numbered_job):
+    """Runs one job, returning a record of its outcome"""
+    index, job = numbered_job
+    src.logging.indent_level = 0
+    record = {"id": job.get("id", index)}
+    start_time = time.time()
+    try:
+        record.update(search(arguments_from_job(job)) or {})
+    except (Exception, SystemExit) as exception:
+        record.update({"status": Status.ERROR.value, "error": repr(exception)})
+    record["time"] = time.time() - start_time
+    return record
+
+
+def main(arguments=None):
+    """Runs the jobs in a manifest on a pool of worker processes, writing one JSON record per job
+
+    Each worker stays alive between jobs, so parsed backgrounds and rules are shared by all the jobs it runs."""
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "manifest",
+        help="File of jobs, one JSON object per line"
+    )
+    parser.add_argument(
+        "-o", "--output_file_name",
+        default=None,
+        help="File for the results to be saved to (default is STDOUT)"
+    )
+    parser.add_argument(
+        "-j", "--processes",
+        type=int,
+        default=None,
+        help="Number of jobs to run at once (default is the number of CPUs)"
+    )
+    args = parser.parse_args(arguments)
+
+    with open(args.manifest, "r") as manifest:
+        jobs = [json.loads(line) for line in manifest if line.strip()]
+
+    output_file = open(args.output_file_name, "a+") if args.output_file_name else sys.stdout
+    try:
+        with multiprocessing.Pool(args.processes) as pool:
+            for record in pool.imap_unordered(run_job, enumerate(jobs)):
+                output_file.write(json.dumps(record) + "\n")
+                output_file.flush()
+    finally:
+        if output_file is not sys.stdout:
+            output_file.close()
@@ -0,0 +1,170 @@
+import math
+from src.literal_manipulation import implies
+
+# The ways of encoding cardinality constraints. The totalizer is implemented in SearchPattern (it defines a variable
+# for each bound it needs, in both directions), the others here (they only encode "at most", in one direction)
+encodings = ["totalizer", "sequential_counter", "modulo_totalizer", "sorting_network"]
+
+
+def force_at_most(search_pattern, literals, amount, encoding):
+    """Adds clauses forcing at most the given amount of literals to be true, using one of the encodings here"""
+
+    amount -= literals.count(1)
+    literals = [literal for literal in literals if abs(literal) != 1]
+
+    if amount < 0:
+        search_pattern.clauses.append([-1])
+    elif amount == 0:
+        for literal in literals:
+            search_pattern.clauses.append([-literal])
+    elif amount < len(literals):
+        if encoding == "sequential_counter":
+            sequential_counter(search_pattern, literals, amount)
+        elif encoding == "modulo_totalizer":
+            modulo_totalizer(search_pattern, literals, amount)
+        elif encoding == "sorting_network":
+            sorting_network(search_pattern, literals, amount)
+        else:
+            raise ValueError('Cardinality encoding "' + encoding + '" not recognised')
+
+
+def new_variables(search_pattern, number):
+    """Gives a list of new variables"""
+    first_variable = search_pattern.number_of_variables + 1
+    search_pattern.number_of_variables += number
+    return list(range(first_variable, first_variable + number))
+
+
+def sequential_counter(search_pattern, literals, amount):
+    """Sinz's sequential counter: registers[j] says that at least j + 1 of the literals so far are true"""
+
+    clauses = search_pattern.clauses
+    registers = None
+    for i, literal in enumerate(literals):
+        if registers is not None:
+            # Never more than amount
+            clauses.append([-literal, -registers[amount - 1]])
+        if i == len(literals) - 1:
+            break
+        new_registers = new_variables(search_pattern, amount)
+        clauses.append(implies(literal, new_registers[0]))
+        if registers is not None:
+            for j in range(amount):
+                clauses.append(implies(registers[j], new_registers[j]))
+                if j > 0:
+                    clauses.append(implies([literal, registers[j - 1]], new_registers[j]))
+        registers = new_registers
+
+
+def unary_sum(search_pattern, counts_0, counts_1, maximum, carry=None):
+    """Adds clauses making a unary count at least the sum of two others, returning it
+
+    A unary count is a list whose entry i - 1 is a literal implied by the count being at least i. The sum is capped at
+    maximum, and if there's a carry literal it's added to the sum too."""
+
+    clauses = search_pattern.clauses
+    total = new_variables(search_pattern, min(len(counts_0) + len(counts_1) + (carry is not None), maximum))
+    for i in range(len(counts_0) + 1):
+        for j in range(len(counts_1) + 1):
+            antecedents = ([counts_0[i - 1]] if i else []) + ([counts_1[j - 1]] if j else [])
+            if i + j:
+                clauses.append(implies(antecedents, total[min(i + j, maximum) - 1]))
+            if carry is not None:
+                clauses.append(implies(antecedents + [carry], total[min(i + j + 1, maximum) - 1]))
+    return total
+
+
+def modulo_totalizer(search_pattern, literals, amount):
+    """Ogawa et al.'s modulo totalizer: each node counts in two unary parts, the quotient and remainder mod modulus"""
+
+    clauses = search_pattern.clauses
+    modulus = max(2, math.isqrt(amount + 1))
+    quotient_bound, remainder_bound = divmod(amount, modulus)
+
+    # Each node is a pair (quotient, remainder) of unary counts. Build the tree a level at a time.
+    nodes = [([], [literal]) for literal in literals]
+    while len(nodes) > 1:
+        next_nodes = []
+        for (quotient_0, remainder_0), (quotient_1, remainder_1) in zip(nodes[::2], nodes[1::2]):
+            # The remainders add up to less than the modulus, or they carry and the remainder is what's left over
+            remainder = new_variables(search_pattern, min(len(remainder_0) + len(remainder_1), modulus - 1))
+            if len(remainder_0) + len(remainder_1) >= modulus:
+                carry = new_variables(search_pattern, 1)[0]
+            else:
+                carry = None
+            for i in range(len(remainder_0) + 1):
+                for j in range(len(remainder_1) + 1):
+                    antecedents = ([remainder_0[i - 1]] if i else []) + ([remainder_1[j - 1]] if j else [])
+                    if i + j >= modulus:
+                        clauses.append(implies(antecedents, carry))
+                        if i + j > modulus:
+                            clauses.append(implies(antecedents, remainder[i + j - modulus - 1]))
+                    elif i + j:
+                        clauses.append(implies(antecedents, remainder[i + j - 1]) + ([carry] if carry else []))
+            quotient = unary_sum(search_pattern, quotient_0, quotient_1, quotient_bound + 1, carry)
+            next_nodes.append((quotient, remainder))
+        if len(nodes) % 2:
+            next_nodes.append(nodes[-1])
+        nodes = next_nodes
+
+    quotient, remainder = nodes[0]
+    if len(quotient) > quotient_bound:
+        clauses.append([-quotient[quotient_bound]])
+    if remainder_bound < len(remainder) and quotient_bound <= len(quotient):
+        clauses.append(([-quotient[quotient_bound - 1]] if quotient_bound else []) + [-remainder[remainder_bound]])
+
+
+def odd_even_merge_sort(size):
+    """Gives the comparators of Batcher's odd-even merge sort on size wires (a power of 2), as pairs of wires"""
+
+    comparators = []
+    p = 1
+    while p < size:
+        k = p
+        while k >= 1:
+            for j in range(k % p, size - k, 2 * k):
+                for i in range(min(k, size - j - k)):
+                    if (i + j) // (2 * p) == (i + j + k) // (2 * p):
+                        comparators.append((i + j, i + j + k))
+            k //= 2
+        p *= 2
+    return comparators
+
+
+def sorting_network(search_pattern, literals, amount):
+    """Sorts the literals with an odd-even merge sort, keeping only the comparators that affect the top amount + 1"""
+
+    clauses = search_pattern.clauses
+    size = 1 << (len(literals) - 1).bit_length()
+    comparators = odd_even_merge_sort(size)
+
+    # Work backwards to find which outputs of which comparators are needed
+    needed = [False] * size
+    for wire in range(amount + 1):
+        needed[wire] = True
+    needed_outputs = []
+    for top, bottom in reversed(comparators):
+        needed_outputs.append((needed[top], needed[bottom]))
+        if needed[top] or needed[bottom]:
+            needed[top] = needed[bottom] = True
+    needed_outputs.reverse()
+
+    # Each comparator puts the larger value (the "or") on the top wire and the smaller one (the "and") on the bottom.
+    # The wires past the end of the literals are false.
+    wires = literals + [-1] * (size - len(literals))
+    for (top, bottom), (top_needed, bottom_needed) in zip(comparators, needed_outputs):
+        literal_0, literal_1 = wires[top], wires[bottom]
+        if literal_1 == -1:
+            continue
+        if literal_0 == -1:
+            wires[top], wires[bottom] = literal_1, -1
+            continue
+        if top_needed:
+            wires[top] = new_variables(search_pattern, 1)[0]
+            clauses.append(implies(literal_0, wires[top]))
+            clauses.append(implies(literal_1, wires[top]))
+        if bottom_needed:
+            wires[bottom] = new_variables(search_pattern, 1)[0]
+            clauses.append(implies([literal_0, literal_1], wires[bottom]))
+
+    clauses.append([-wires[amount]])
@@ -0,0 +1,71 @@
+import pickle
+import struct
+import numpy as np
+from src.ClauseList import ClauseList
+from src.SearchPattern import SearchPattern
+from src.logging import log
+
+# A checkpoint file is a header, then the pickled state of the search pattern (apart from its clauses), then the
+# clauses as two raw little-endian arrays: the literals (int32) and the offsets where each clause starts (int64). Both
+# arrays start on an 8-byte boundary, so the clause section can be memory-mapped.
+magic = b"LLSSTATE"
+format_version = 2
+header = struct.Struct("<8sIIQQQ")  # Magic, version, (reserved), length of the state, number of literals and clauses
+alignment = 8
+
+
+def aligned(position):
+    return -(-position // alignment) * alignment
+
+
+def section_positions(state_length, number_of_literals):
+    """The positions in the file of the literals and the offsets"""
+    literals_position = aligned(header.size + state_length)
+    offsets_position = aligned(literals_position + 4 * number_of_literals)
+    return literals_position, offsets_position
+
+
+def save(file_name, search_pattern):
+    """Saves a search pattern to a checkpoint file"""
+    log('Saving state to "' + file_name + '" ...', 1)
+    state = search_pattern.state()
+    clauses = state.pop("clauses")
+    state_bytes = pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+    literals = np.frombuffer(clauses.literals, dtype=np.int32).astype("<i4", copy=False)
+    offsets = np.frombuffer(clauses.offsets, dtype=np.int64).astype("<i8", copy=False)
+    literals_position, offsets_position = section_positions(len(state_bytes), len(literals))
+
+    with open(file_name, "wb") as checkpoint_file:
+        checkpoint_file.write(header.pack(magic, format_version, 0, len(state_bytes), len(literals), len(clauses)))
+        checkpoint_file.write(state_bytes)
+        checkpoint_file.write(bytes(literals_position - checkpoint_file.tell()))
+        checkpoint_file.write(literals.tobytes())
+        checkpoint_file.write(bytes(offsets_position - checkpoint_file.tell()))
+        checkpoint_file.write(offsets.tobytes())
+    log('Done\n', -1)
+
+
+def load(file_name):
+    """Loads a search pattern from a checkpoint file"""
+    log('Loading state from "' + file_name + '" ...', 1)
+    with open(file_name, "rb") as checkpoint_file:
+        (
+            file_magic,
+            version,
+            _,
+            state_length,
+            number_of_literals,
+            number_of_clauses
+        ) = header.unpack(checkpoint_file.read(header.size))
+        assert file_magic == magic, '"' + file_name + '" is not an LLS state file'
+        assert version == format_version, "State file has version " + str(version) + ", expected " + str(
+            format_version)
+        state = pickle.loads(checkpoint_file.read(state_length))
+
+    literals_position, offsets_position = section_positions(state_length, number_of_literals)
+    literals = np.memmap(file_name, dtype="<i4", mode="r", offset=literals_position, shape=(number_of_literals,))
+    offsets = np.memmap(file_name, dtype="<i8", mode="r", offset=offsets_position, shape=(number_of_clauses + 1,))
+    state["clauses"] = ClauseList.from_arrays(literals, offsets)
+    del literals, offsets
+    log('Done\n', -1)
+    return SearchPattern.from_state(state)
@@ -0,0 +1,84 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import settings
+import src.files
+from src.logging import log
+from src.profiling import profiled
+
+# Bump this whenever the preprocessing or the encodings change, so that old cache files are ignored
+cache_version = 3
+
+
+def cache_key(*inputs):
+    """A hash of everything that determines the clauses of a search"""
+    return hashlib.sha1(repr((cache_version,) + inputs).encode("utf-8")).hexdigest()
+
+
+def cache_directory():
+    """The directory the cache is kept in, outside the source tree unless settings.py says otherwise"""
+    if settings.cnf_cache_directory is not None:
+        return os.path.expanduser(settings.cnf_cache_directory)
+    user_cache_directory = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(user_cache_directory, "lls")
+
+
+def cache_file_name(key):
+    return os.path.join(cache_directory(), "cnf_" + key + ".pkl")
+
+
+@profiled("cnf_cache_load")
+def load(key):
+    """Loads the cached outcome of preprocessing, as a pair (unsat, state), or returns None if it isn't cached"""
+    file_name = cache_file_name(key)
+    if not os.path.isfile(file_name):
+        return None
+    try:
+        version, cached_key, unsat, state = src.files.object_from_file(file_name)
+    except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+        return None
+    if version != cache_version or cached_key != key:
+        return None
+
+    log("Using cached clauses", 0, 2)
+    try:
+        # Mark the file as recently used
+        os.utime(file_name)
+    except OSError:
+        pass
+    return unsat, state
+
+
+def store(key, unsat, state):
+    """Saves the outcome of preprocessing, then evicts the least recently used files if the cache is too big"""
+    file_name = cache_file_name(key)
+    try:
+        os.makedirs(cache_directory(), exist_ok=True)
+        # Write to a temporary file first, so that a search running at the same time never sees half a file
+        temporary_file, temporary_file_name = tempfile.mkstemp(dir=cache_directory(), prefix="cnf_", suffix=".tmp")
+        with os.fdopen(temporary_file, "wb") as output_file:
+            pickle.dump((cache_version, key, unsat, state), output_file)
+        os.replace(temporary_file_name, file_name)
+        evict(settings.cnf_cache_size)
+    except OSError:
+        log("Could not save the clauses to the cache")
+
+
+def evict(maximum_size):
+    """Deletes the least recently used cached clauses until the cache is at most maximum_size bytes"""
+    entries = []
+    for entry in os.scandir(cache_directory()):
+        if entry.name.startswith("cnf_") and entry.name.endswith(".pkl"):
+            status = entry.stat()
+            entries.append((status.st_mtime, status.st_size, entry.path))
+
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total_size <= maximum_size:
+            break
+        try:
+            os.remove(path)
+            total_size -= size
+        except OSError:
+            pass
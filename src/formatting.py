@@ -1,12 +1,14 @@
+import io
 import re
-import copy
 from src.rules import rulestring_from_rule
 from src.logging import log
+from src.profiling import profiled
 from src.utilities import format_carriage_returns, make_grid
 from src.literal_manipulation import standard_form_literal
 from src.sat_solvers import Status
 
 
+@profiled("parse_input_string")
 def parse_input_string(input_string):
     """Parses a search pattern given as a string"""
 
@@ -65,24 +67,15 @@ def make_rle(grid, solution, background_grid=None, rule=None, determined=None, s
     """Turn a search pattern into nicely formatted string form"""
     log('Format: RLE')
 
-    grid = copy.deepcopy(grid)
-
     width = len(grid[0][0])
     height = len(grid[0])
 
-    for t, generation in enumerate(grid):
-        for y, row in enumerate(generation):
-            for x, cell in enumerate(row):
-                if cell in solution:
-                    grid[t][y][x] = "o"
-                else:
-                    grid[t][y][x] = "b"
+    grid = [[["o" if cell in solution else "b" for cell in row] for row in generation] for generation in grid]
 
     rle_string = "x = " + str(width) + ", y = " + str(height)
 
     if rule is not None:
-        for transition in rule:
-            rule[transition] = 1 if rule[transition] in solution else -1
+        rule = {transition: 1 if literal in solution else -1 for transition, literal in rule.items()}
         rle_string += ", rule = " + rulestring_from_rule(rule)
 
     rle_string += "\n"
@@ -97,15 +90,8 @@ def make_rle(grid, solution, background_grid=None, rule=None, determined=None, s
 
     if show_background:
         rle_string += "\nBackground:\n"
-        background_grid = copy.deepcopy(background_grid)
-
-        for t, generation in enumerate(background_grid):
-            for y, row in enumerate(generation):
-                for x, cell in enumerate(row):
-                    if cell in solution:
-                        background_grid[t][y][x] = "o"
-                    else:
-                        background_grid[t][y][x] = "b"
+        background_grid = [[["o" if cell in solution else "b" for cell in row] for row in generation]
+                           for generation in background_grid]
 
         rle_string += "\n\n".join(
             "$\n".join("".join(line) for line in generation) for generation in background_grid) + "\n"
@@ -151,6 +137,8 @@ def space_evenly(grid, ignore_transition=None):
     grid = [[[str(cell) for cell in row] for row in generation] for generation in grid]
     if ignore_transition is None:
         ignore_transition = make_grid(False, template=grid)
+    else:
+        ignore_transition = [[[bool(flag) for flag in row] for row in generation] for generation in ignore_transition]
 
     lengths = []
     for t, generation in enumerate(grid):
@@ -195,8 +183,6 @@ def make_blk(
 
     log('Format: blk')
 
-    grid = copy.deepcopy(grid)
-
     width = len(grid[0][0])
     height = len(grid[0])
     period = len(grid)
@@ -211,8 +197,7 @@ def make_blk(
     blk_string = "x = " + str(width) + ", y = " + str(height)
 
     if rule is not None:
-        for transition in rule:
-            rule[transition] = 1 if rule[transition] in solution else -1
+        rule = {transition: 1 if literal in solution else -1 for transition, literal in rule.items()}
         blk_string += ", rule = " + rulestring_from_rule(rule)
 
     block = []
@@ -227,25 +212,79 @@ def make_blk(
 
 def clauses_to_dimacs(clauses, number_of_variables):
     log('Writing clauses into DIMACS format ...', 1)
-    dimacs = f"p cnf {number_of_variables} {len(clauses)}\n" + "".join(
-        ' '.join(str(literal) for literal in clause) + ' 0\n' for clause in clauses)
+    dimacs_file = io.StringIO()
+    write_dimacs(clauses, number_of_variables, dimacs_file)
     log('Done\n', -1)
-    return dimacs
+    return dimacs_file.getvalue()
+
+
+@profiled("write_dimacs")
+def write_dimacs(clauses, number_of_variables, output_file, chunk_size=10000):
+    """Writes clauses in DIMACS format to a file object, serializing them a chunk at a time"""
+    output_file.write(f"p cnf {number_of_variables} {len(clauses)}\n")
+    for start in range(0, len(clauses), chunk_size):
+        output_file.write("".join(
+            ' '.join(str(literal) for literal in clause) + ' 0\n' for clause in clauses[start:start + chunk_size]))
 
 
 def format_dimacs_output(dimacs_output):
-    lines = dimacs_output.strip('\n').split('\n')
+    return parse_dimacs_output(dimacs_output.strip('\n').split('\n'))
 
-    statuses = [line[2:] for line in lines if line[0] == 's']
-    variable_lines = [line[2:] for line in lines if line[0] == 'v']
+
+@profiled("parse_dimacs_output")
+def parse_dimacs_output(lines):
+    """Parses a SAT solver's output a line at a time, returning the status and (if satisfiable) the model
+
+    The lines can come straight from the solver's pipe, so the whole output is never held in memory."""
+
+    statuses = []
+    model = Model()
+    for line in lines:
+        if line[:1] == 's':
+            statuses.append(line[2:].strip())
+        elif line[:1] == 'v':
+            model.update(int(literal) for literal in line[2:].split() if literal != '0')
 
     if len(statuses) != 1:
         raise Exception('Wrong number of status lines')
     if statuses[0] == 'UNSATISFIABLE':
         return Status.UNSAT, None
     elif statuses[0] == 'SATISFIABLE':
-        solution = set(int(literal) for line in variable_lines for literal in line.split() if literal != '0')
-        return Status.SAT, solution
+        return Status.SAT, model
     else:
         raise Exception('Unknown exit status for SAT solver')
 
+
+class Model:
+    """
+    The values a SAT solver gave the variables
+
+    Stored as one byte per variable (0 if it has no value, 1 if it's
+    true and 2 if it's false), but it can be used like the set of
+    literals that are true.
+
+    """
+
+    def __init__(self, literals=()):
+        self.values = bytearray()
+        self.update(literals)
+
+    def update(self, literals):
+        values = self.values
+        for literal in literals:
+            variable = abs(literal)
+            if variable >= len(values):
+                values.extend(bytes(max(variable + 1 - len(values), len(values))))
+            values[variable] = 1 if literal > 0 else 2
+
+    def __contains__(self, literal):
+        variable = abs(literal)
+        return variable < len(self.values) and self.values[variable] == (1 if literal > 0 else 2)
+
+    def __iter__(self):
+        for variable, value in enumerate(self.values):
+            if value:
+                yield variable if value == 1 else -variable
+
+    def __len__(self):
+        return len(self.values) - self.values.count(0)
@@ -1,4 +1,5 @@
 import re
+import numpy as np
 
 
 def variable_from_literal(literal):
@@ -45,6 +46,10 @@ def neighbours_from_coordinates(grid, x, y, t, t_offset=-1, background_grid=None
 
 
 def offset_background(grid, x_offset, y_offset, t_offset):
+    if isinstance(grid, np.ndarray):
+        grid[...] = np.roll(grid, (-t_offset, -y_offset, -x_offset), axis=(0, 1, 2))
+        return
+
     width = len(grid[0][0])
     height = len(grid[0])
     duration = len(grid)
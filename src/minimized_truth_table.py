@@ -0,0 +1,181 @@
+import hashlib
+import os
+import pickle
+import functools
+import src.files
+import src.cnf_cache
+import src.rules
+from src.literal_manipulation import variable_from_literal, neighbours_from_coordinates
+from src.logging import log
+
+# Bump this whenever the format or the minimization changes, so that old cache files are ignored
+cache_version = 1
+
+# Codes used in clause templates. A template is a tuple of signed codes: 1 to 9 stand for the predecessor cell and its
+# 8 neighbours (in the order of src.rules.neighbourhood_index), 10 for the cell itself, and 11 upwards for the
+# variables of the rule, in the order given by canonical_rule
+cell_code = 10
+first_rule_code = 11
+
+
+def canonical_rule(rule):
+    """Renumbers the variables of a rule in order of first appearance, returning the new rule and the old variables"""
+    rule_variables = []
+    canonical = {}
+    for transition in sorted(rule):
+        literal = rule[transition]
+        if literal in [-1, 1]:
+            canonical[transition] = literal
+        else:
+            variable, sign = variable_from_literal(literal)
+            if variable not in rule_variables:
+                rule_variables.append(variable)
+            canonical[transition] = (rule_variables.index(variable) + 2) * sign
+    return canonical, rule_variables
+
+
+def canonical_rulestring(canonical):
+    """A string that determines a canonical rule uniquely"""
+    if any(literal < -1 for literal in canonical.values()):
+        return "{" + ", ".join(
+            ("'" + transition + "': '" + str(literal) + "'") for transition, literal in sorted(canonical.items())) + "}"
+    return src.rules.rulestring_from_rule(canonical)
+
+
+def prime_implicants(on_set, allowed_set):
+    """Finds the prime implicants of allowed_set that contain a minterm of on_set
+
+    Minterms are 9-bit integers and cubes are (value, mask) pairs, where the bits in mask are free."""
+
+    @functools.lru_cache(maxsize=None)
+    def is_implicant(value, mask):
+        if mask == 0:
+            return value in allowed_set
+        bit = mask & -mask
+        return is_implicant(value, mask ^ bit) and is_implicant(value | bit, mask ^ bit)
+
+    primes = set()
+    visited = set()
+    to_visit = [(minterm, 0) for minterm in on_set]
+    while to_visit:
+        cube = to_visit.pop()
+        if cube in visited:
+            continue
+        visited.add(cube)
+        value, mask = cube
+        prime = True
+        for i in range(9):
+            bit = 1 << i
+            if not mask & bit and is_implicant(value & ~bit, mask | bit):
+                prime = False
+                to_visit.append((value & ~bit, mask | bit))
+        if prime:
+            primes.add(cube)
+    return primes
+
+
+def minimum_cover(on_set, primes):
+    """Chooses a small set of primes covering on_set: first the essential primes, then greedily"""
+
+    covers = {cube: frozenset(minterm for minterm in on_set if minterm & ~cube[1] == cube[0]) for cube in primes}
+    uncovered = set(on_set)
+    cover = []
+
+    for minterm in sorted(on_set):
+        covering = [cube for cube in covers if minterm in covers[cube]]
+        if len(covering) == 1 and covering[0] not in cover:
+            cover.append(covering[0])
+            uncovered -= covers[covering[0]]
+
+    while uncovered:
+        cube = max(sorted(covers), key=lambda cube: (len(covers[cube] & uncovered), bin(cube[1]).count("1")))
+        cover.append(cube)
+        uncovered -= covers[cube]
+
+    return cover
+
+
+def cube_codes(cube):
+    """Gives the codes of the literals that are false inside the cube"""
+    value, mask = cube
+    return tuple(
+        (-(i + 1) if value >> (8 - i) & 1 else i + 1)
+        for i in range(9) if not mask >> (8 - i) & 1)
+
+
+def minimize(canonical):
+    """Derives clause templates encoding the transition function of a canonical rule"""
+    table = src.rules.transition_table(canonical)
+    templates = []
+    for cell_sign in [1, -1]:
+        constant = cell_sign
+        # Every literal class is covered separately. Neighbourhoods with the constant answer are don't cares.
+        classes = sorted(set(table), key=lambda literal: (literal != constant, abs(literal), literal))
+        for literal in classes:
+            if literal == -constant:
+                continue
+            on_set = frozenset(index for index in range(512) if table[index] == literal)
+            allowed_set = frozenset(index for index in range(512) if table[index] in [literal, constant])
+            for cube in minimum_cover(on_set, prime_implicants(on_set, allowed_set)):
+                template = cube_codes(cube)
+                if literal != constant:
+                    variable, sign = variable_from_literal(literal)
+                    # If the neighbourhood is in the cube and the literal agrees with cell_sign, so does the cell
+                    template += (-(variable - 2 + first_rule_code) * sign * cell_sign,)
+                templates.append(template + (cell_code * cell_sign,))
+    return tuple(templates)
+
+
+def cache_file_name(rulestring):
+    return os.path.join(
+        src.cnf_cache.cache_directory(), "truth_table_" + hashlib.sha1(rulestring.encode("utf-8")).hexdigest() + ".pkl")
+
+
+@functools.lru_cache(maxsize=None)
+def templates_from_rulestring(rulestring, canonical_items):
+    """Loads the clause templates for a canonical rule from the cache on disk, or minimizes and saves them"""
+    file_name = cache_file_name(rulestring)
+    if os.path.isfile(file_name):
+        try:
+            version, cached_rulestring, templates = src.files.object_from_file(file_name)
+            if version == cache_version and cached_rulestring == rulestring:
+                return templates
+        except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+            pass
+
+    log("Minimizing the transition function of " + rulestring + " ...", 1)
+    templates = minimize(dict(canonical_items))
+    log("Done\n", -1)
+    try:
+        os.makedirs(os.path.dirname(file_name), exist_ok=True)
+        src.files.file_from_object(file_name, (cache_version, rulestring, templates))
+    except OSError:
+        log("Could not save the minimized transition function")
+    return templates
+
+
+def clause_templates(rule):
+    """Gives clause templates encoding the rule, and the rule variables that the codes from 11 upwards stand for"""
+    return _clause_templates(tuple(sorted(rule.items())))
+
+
+@functools.lru_cache(maxsize=None)
+def _clause_templates(rule_items):
+    canonical, rule_variables = canonical_rule(dict(rule_items))
+    templates = templates_from_rulestring(canonical_rulestring(canonical), tuple(sorted(canonical.items())))
+    return templates, rule_variables
+
+
+def transition_rule(search_pattern, grid, x, y, t, background_grid):
+    """Creates clauses enforcing the transition rule at coordinates x, y, t of grid"""
+
+    duration = len(grid)
+    templates, rule_variables = clause_templates(search_pattern.rule)
+
+    predecessor_cell = grid[(t - 1) % duration][y][x]
+    neighbours = neighbours_from_coordinates(grid, x, y, t, background_grid=background_grid)
+    literals = [None, predecessor_cell] + neighbours + [grid[t][y][x]] + rule_variables
+
+    for template in templates:
+        search_pattern.clauses.append(
+            [literals[code] if code > 0 else -literals[-code] for code in template])
@@ -0,0 +1,223 @@
+import collections
+from src.ClauseList import ClauseList
+from src.logging import log
+
+
+class Preprocessor:
+    """
+    Simplifies the clauses before they go to the solver
+
+    Runs unit propagation, removes duplicate, tautological and
+    subsumed clauses, and eliminates variables by resolution when
+    that doesn't increase the number of clauses. Only variables that
+    aren't frozen are eliminated, so the frozen ones (those the
+    output is made from, or that later clauses can mention) keep
+    their meaning.
+
+    The values of the variables that were fixed or eliminated are
+    kept, so that a model of the simplified clauses can be extended
+    to a model of the original ones.
+
+    """
+
+    max_resolvent_length = 16  # Don't eliminate a variable if it would make a clause longer than this
+    max_resolutions = 256  # Don't eliminate a variable with more pairs of clauses to resolve than this
+
+    def __init__(self, frozen_variables, number_of_variables):
+        self.frozen_variables = set(frozen_variables)
+        self.number_of_variables = number_of_variables
+        self.fixed = set()  # The literals made true by unit propagation
+        self.eliminated = []  # The reconstruction stack: each eliminated variable, with the clauses it was in
+        self.eliminated_variables = set()
+        self.clauses = ClauseList()
+        self.number_of_clauses_seen = 0
+
+        # The working clause database, with None in place of removed clauses
+        self.working_clauses = []
+        self.occurrences = collections.defaultdict(set)
+        self.units = []
+        self.unsat = False
+
+    def update(self, clauses):
+        """Gives the simplified clauses, simplifying any clauses that haven't been seen yet
+
+        The first time, the whole preprocessing is run. After that new clauses (such as the ones blocking earlier
+        solutions) are only simplified by the fixed literals, so they mustn't mention any eliminated variable."""
+
+        if self.number_of_clauses_seen == 0:
+            self.preprocess(clauses)
+        else:
+            for clause in clauses[self.number_of_clauses_seen:]:
+                assert not self.eliminated_variables.intersection(abs(literal) for literal in clause), \
+                    "Clause mentions an eliminated variable"
+                if not any(literal in self.fixed for literal in clause):
+                    self.clauses.append([literal for literal in clause if -literal not in self.fixed])
+        self.number_of_clauses_seen = len(clauses)
+        return self.clauses
+
+    def preprocess(self, clauses):
+        log("Preprocessing clauses...", 1)
+        number_of_clauses = len(clauses)
+        number_of_literals = clauses.number_of_literals()
+
+        duplicates = 0
+        tautologies = 0
+        seen = set()
+        for clause in clauses:
+            clause = tuple(sorted(set(clause)))
+            if any(-literal in clause for literal in clause if literal > 0):
+                tautologies += 1
+            elif clause in seen:
+                duplicates += 1
+            else:
+                seen.add(clause)
+                self.add_clause(list(clause))
+        del seen
+        log("Duplicate clauses removed: " + str(duplicates))
+        log("Tautologies removed: " + str(tautologies))
+
+        remaining = self.number_of_clauses()
+        self.propagate()
+        log("Unit propagation: " + str(len(self.fixed)) + " literals fixed, " + str(
+            remaining - self.number_of_clauses()) + " clauses removed")
+
+        remaining = self.number_of_clauses()
+        self.remove_subsumed_clauses()
+        log("Subsumed clauses removed: " + str(remaining - self.number_of_clauses()))
+
+        remaining = self.number_of_clauses()
+        self.eliminate_variables()
+        log("Variable elimination: " + str(len(self.eliminated)) + " variables eliminated, " + str(
+            remaining - self.number_of_clauses()) + " clauses removed")
+
+        if self.unsat:
+            log("Unsatisfiability proved in preprocessing")
+            self.clauses = ClauseList([[]])
+        else:
+            self.clauses = ClauseList(clause for clause in self.working_clauses if clause is not None)
+        self.working_clauses = []
+        self.occurrences.clear()
+
+        log("Number of clauses: " + str(number_of_clauses) + " -> " + str(len(self.clauses)), 0, 2)
+        log("Number of literals: " + str(number_of_literals) + " -> " + str(self.clauses.number_of_literals()), 0, 2)
+        log("Done\n", -1)
+
+    def number_of_clauses(self):
+        return len(self.working_clauses) - self.working_clauses.count(None)
+
+    def add_clause(self, clause):
+        """Adds a clause to the working clauses, simplified by the fixed literals"""
+        if any(literal in self.fixed for literal in clause):
+            return
+        clause = [literal for literal in clause if -literal not in self.fixed]
+        index = len(self.working_clauses)
+        self.working_clauses.append(clause)
+        for literal in clause:
+            self.occurrences[literal].add(index)
+        if len(clause) == 1:
+            self.units.append(clause[0])
+        elif len(clause) == 0:
+            self.unsat = True
+
+    def remove_clause(self, index):
+        for literal in self.working_clauses[index]:
+            self.occurrences[literal].discard(index)
+        self.working_clauses[index] = None
+
+    def propagate(self):
+        """Fixes the literals of the unit clauses, and everything they imply"""
+        while self.units and not self.unsat:
+            literal = self.units.pop()
+            if literal in self.fixed:
+                continue
+            if -literal in self.fixed:
+                self.unsat = True
+                break
+            self.fixed.add(literal)
+            for index in list(self.occurrences[literal]):
+                self.remove_clause(index)
+            for index in list(self.occurrences[-literal]):
+                clause = self.working_clauses[index]
+                clause.remove(-literal)
+                if len(clause) == 1:
+                    self.units.append(clause[0])
+                elif len(clause) == 0:
+                    self.unsat = True
+            self.occurrences[-literal].clear()
+
+    def remove_subsumed_clauses(self):
+        """Removes every clause that contains all the literals of another"""
+        if self.unsat:
+            return
+        indices = [index for index, clause in enumerate(self.working_clauses) if clause is not None]
+        indices.sort(key=lambda index: len(self.working_clauses[index]))
+        for index in indices:
+            clause = self.working_clauses[index]
+            if clause is None:
+                continue
+            # Every clause the clause subsumes contains its literal with the fewest occurrences
+            literal = min(clause, key=lambda literal: len(self.occurrences[literal]))
+            clause_set = set(clause)
+            for other_index in list(self.occurrences[literal]):
+                if other_index != index and clause_set.issubset(self.working_clauses[other_index]):
+                    self.remove_clause(other_index)
+
+    def eliminate_variables(self):
+        """Eliminates the variables that aren't frozen by resolution, if it doesn't increase the number of clauses"""
+        variables = set(abs(literal) for literal, indices in self.occurrences.items() if indices)
+        variables.difference_update(self.frozen_variables)
+        costs = {variable: len(self.occurrences[variable]) * len(self.occurrences[-variable]) for variable in variables}
+        for variable in sorted(variables, key=lambda variable: (costs[variable], variable)):
+            if self.unsat:
+                break
+            positive = list(self.occurrences[variable])
+            negative = list(self.occurrences[-variable])
+            if not positive and not negative or len(positive) * len(negative) > self.max_resolutions:
+                continue
+            resolvents = self.resolvents(variable, positive, negative)
+            if resolvents is None:
+                continue
+            self.eliminated.append((variable, [self.working_clauses[index] for index in positive + negative]))
+            self.eliminated_variables.add(variable)
+            for index in positive + negative:
+                self.remove_clause(index)
+            for resolvent in resolvents:
+                self.add_clause(list(resolvent))
+            self.propagate()
+
+    def resolvents(self, variable, positive, negative):
+        """The clauses that replace those with the variable if it's eliminated, or None if there would be too many"""
+        resolvents = set()
+        for positive_index in positive:
+            positive_clause = self.working_clauses[positive_index]
+            for negative_index in negative:
+                resolvent = set(positive_clause)
+                resolvent.update(self.working_clauses[negative_index])
+                resolvent.discard(variable)
+                resolvent.discard(-variable)
+                if any(-literal in resolvent for literal in resolvent if literal > 0):
+                    continue
+                if len(resolvent) > self.max_resolvent_length:
+                    return None
+                resolvents.add(tuple(sorted(resolvent)))
+                if len(resolvents) > len(positive) + len(negative):
+                    return None
+        return resolvents
+
+    def extend_model(self, solution):
+        """Extends a solution of the simplified clauses to a solution of the original ones"""
+        model = set(solution)
+        model.difference_update(-literal for literal in self.fixed)
+        model.update(self.fixed)
+        for variable in range(1, self.number_of_variables + 1):
+            if variable not in model and -variable not in model:
+                model.add(-variable)
+        # Undo the eliminations in reverse, making the variable true only if one of its clauses needs it to be
+        for variable, clauses in reversed(self.eliminated):
+            model.discard(variable)
+            model.discard(-variable)
+            needed = any(
+                variable in clause and not any(literal in model for literal in clause if literal != variable)
+                for clause in clauses)
+            model.add(variable if needed else -variable)
+        return model
@@ -0,0 +1,102 @@
+import functools
+import json
+import sys
+import threading
+import time
+from src.logging import log
+
+try:
+    import resource
+except ImportError:
+    resource = None  # Only needed for the peak memory use, which isn't available on Windows
+
+records = None  # The phases profiled so far, or None if profiling is off
+notes = []  # Anything the reader of the report should know, such as phases that were skipped
+start_time = None
+nesting = threading.local()  # How many profiled phases each thread is inside
+
+
+def start():
+    """Turns profiling on, forgetting any earlier phases"""
+    global records, notes, start_time
+    records = []
+    notes = []
+    start_time = time.perf_counter()
+
+
+def stop():
+    global records
+    records = None
+
+
+def note(message):
+    """Adds a note to the report, if profiling is on"""
+    if records is not None:
+        notes.append(message)
+
+
+def peak_rss():
+    """The most memory the process has used so far, in bytes"""
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def size(search_pattern):
+    """The number of clauses and variables of a search pattern (or None, for anything else)"""
+    clauses = getattr(search_pattern, "clauses", None)
+    number_of_variables = getattr(search_pattern, "number_of_variables", None)
+    return len(clauses) if clauses is not None else None, number_of_variables
+
+
+def profiled(name):
+    """Decorates a function so that each call is recorded as a phase while profiling is on
+
+    A phase records its wall time, CPU time and the peak memory use at its end. For methods of a search pattern, it
+    also records how many clauses and variables were added."""
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if records is None:
+                return function(*args, **kwargs)
+            depth = getattr(nesting, "depth", 0)
+            nesting.depth = depth + 1
+            clauses_before, variables_before = size(args[0]) if args else (None, None)
+            wall_time, cpu_time = time.perf_counter(), time.process_time()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                wall_time, cpu_time = time.perf_counter() - wall_time, time.process_time() - cpu_time
+                nesting.depth = depth
+                clauses_after, variables_after = size(args[0]) if args else (None, None)
+                if records is not None:
+                    records.append({
+                        "name": name,
+                        "depth": depth,
+                        "start": time.perf_counter() - start_time - wall_time,
+                        "wall_time": wall_time,
+                        "cpu_time": cpu_time,
+                        "peak_rss": peak_rss(),
+                        "clauses_added": None if clauses_after is None else clauses_after - (clauses_before or 0),
+                        "variables_added": None if variables_after is None else variables_after - (
+                                variables_before or 0)
+                    })
+        return wrapper
+    return decorator
+
+
+def write_report(file_name):
+    """Writes the phases profiled so far to a JSON file, in the order they started"""
+    log('Writing profile to "' + file_name + '" ...', 1)
+    report = {
+        "wall_time": time.perf_counter() - start_time,
+        "cpu_time": time.process_time(),
+        "peak_rss": peak_rss(),
+        "notes": notes,
+        "phases": sorted(records, key=lambda record: record["start"])
+    }
+    with open(file_name, "w") as report_file:
+        json.dump(report, report_file, indent=2)
+    log('Done\n', -1)
@@ -1,5 +1,8 @@
 import re
 import ast
+import functools
+import itertools
+import numpy as np
 from src.literal_manipulation import variable_from_literal, standard_form_literal
 from src.logging import log
 
@@ -69,6 +72,24 @@ transition_lookup = {
 
 
 def rule_from_rulestring(rulestring, number_of_variables):
+    """Parses a rulestring, numbering any rule variables from number_of_variables + 1 upwards
+
+    Parsed rules are cached (with their variables numbered from 2), so that each rulestring is only parsed once."""
+    rule_items, number_of_rule_variables = _rule_from_rulestring(rulestring)
+    rule = {
+        transition: literal if literal in [-1, 1] else literal + number_of_variables - 1
+        for transition, literal in rule_items
+    }
+    return rule, number_of_variables + number_of_rule_variables
+
+
+@functools.lru_cache(maxsize=None)
+def _rule_from_rulestring(rulestring):
+    rule, number_of_variables = parse_rulestring(rulestring, 1)
+    return tuple(rule.items()), number_of_variables - 1
+
+
+def parse_rulestring(rulestring, number_of_variables):
     rule = {}
 
     original_rulestring = rulestring
@@ -244,7 +265,31 @@ def rulestring_from_rule(rule):
 
 
 def transition_from_cells(neighbours):
-    return transition_lookup[sort_neighbours(neighbours)]
+    return transitions_by_index[neighbourhood_index(-1, neighbours)]
+
+
+def neighbourhood_index(predecessor_cell, neighbours):
+    """Packs the states (-1 or 1) of a predecessor cell and its 8 neighbours into a 9-bit index
+
+    The predecessor cell is the most significant bit, followed by the neighbours in order.
+    """
+    index = predecessor_cell == 1
+    for neighbour in neighbours:
+        index = (index << 1) | (neighbour == 1)
+    return index
+
+
+def transition_table(rule):
+    """Gives a 512-entry tuple mapping each neighbourhood index to the literal the rule assigns to it"""
+    return _transition_table(tuple(sorted(rule.items())))
+
+
+@functools.lru_cache(maxsize=None)
+def _transition_table(rule_items):
+    rule = dict(rule_items)
+    return tuple(
+        rule[("S" if index >> 8 else "B") + transitions_by_index[index & 255]]
+        for index in range(512))
 
 
 def sort_neighbours(neighbours):
@@ -264,3 +309,41 @@ def sort_neighbours(neighbours):
                 neighbours[3]),
                (neighbours[4], neighbours[3], neighbours[2], neighbours[1], neighbours[0], neighbours[7], neighbours[6],
                 neighbours[5]))
+
+
+# The orders of the neighbours that sort_neighbours chooses between (the 8 symmetries of the square)
+neighbour_symmetries = (
+    (0, 1, 2, 3, 4, 5, 6, 7),
+    (6, 7, 0, 1, 2, 3, 4, 5),
+    (4, 5, 6, 7, 0, 1, 2, 3),
+    (2, 3, 4, 5, 6, 7, 0, 1),
+    (6, 5, 4, 3, 2, 1, 0, 7),
+    (0, 7, 6, 5, 4, 3, 2, 1),
+    (2, 1, 0, 7, 6, 5, 4, 3),
+    (4, 3, 2, 1, 0, 7, 6, 5)
+)
+
+
+def sort_neighbours_array(neighbours):
+    """Does what sort_neighbours does to every row of an array of shape (number of cells, 8)"""
+    orders = neighbours[:, neighbour_symmetries]  # Shape (number of cells, 8 symmetries, 8)
+    candidates = np.ones(orders.shape[:2], dtype=bool)
+    # Keep the symmetries that are lexicographically largest so far, one position at a time
+    for position in range(8):
+        values = np.where(candidates, orders[:, :, position], np.iinfo(orders.dtype).min)
+        candidates &= values == values.max(axis=1, keepdims=True)
+    return orders[np.arange(len(orders)), candidates.argmax(axis=1)]
+
+
+def neighbourhood_index_array(predecessor_cells, neighbours):
+    """Does what neighbourhood_index does to arrays of predecessor cells and neighbours"""
+    index = (predecessor_cells == 1).astype(np.int64)
+    for i in range(8):
+        index = (index << 1) | (neighbours[:, i] == 1)
+    return index
+
+
+# Every neighbourhood, as a tuple of states (-1 or 1) of the predecessor cell and its 8 neighbours, in index order
+neighbourhood_states = tuple(itertools.product([-1, 1], repeat=9))
+
+transitions_by_index = tuple(transition_lookup[sort_neighbours(states[1:])] for states in neighbourhood_states[:256])
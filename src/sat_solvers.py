@@ -1,10 +1,25 @@
 import time
+import os
+import shutil
+import itertools
+import concurrent.futures
 import subprocess
 import sys
 import enum
+import collections
+import queue
+import tempfile
+import threading
 import settings
 import src.formatting
+import src.logging
 from src.logging import log
+from src.profiling import profiled
+
+try:
+    import pysat.solvers
+except ImportError:
+    pysat = None  # Only needed for incremental solving
 
 
 class Status(enum.Enum):
@@ -15,49 +30,471 @@ class Status(enum.Enum):
     ERROR = 'Error'
 
 
-def sat_solve(dimacs_string, solver=None, parameters=None, timeout=None):
-    """Solve the given DIMACS problem, using the specified SAT solver"""
+@profiled("sat_solve")
+def sat_solve(clauses, number_of_variables, solver=None, parameters=None, timeout=None):
+    """Solve the given clauses, using the specified SAT solver
+
+    The clauses are streamed to the solver in DIMACS format as they are serialized, through its STDIN or (for the
+    solvers in settings.solvers_reading_files) through a temporary file."""
 
     log('Solving...', 1)
 
     if solver is None:
         solver = settings.solver
 
-    parameter_list = parameters.strip(" ").split(" ") if parameters is not None else []
-    solver_path = sys.path[0] + "/solvers/" + solver
-    command = [solver_path] + parameter_list
+    command = solver_command(solver, parameters)
+
+    dimacs_file = None
+    if solver in settings.solvers_reading_files:
+        log('Writing DIMACS file...', 1)
+        dimacs_file = tempfile.NamedTemporaryFile("w", prefix="lls_", suffix=".cnf", encoding="utf-8")
+        src.formatting.write_dimacs(clauses, number_of_variables, dimacs_file)
+        dimacs_file.flush()
+        command.append(dimacs_file.name)
+        log('Done\n', -1)
 
     log('Solving with "' + solver + '" ... (Start time: ' + time.ctime() + ")", 1)
 
     try:
         start_time = time.time()
-        sat_solver_process = subprocess.run(
+        sat_solver_process = subprocess.Popen(
             command,
-            input=dimacs_string,
-            capture_output=True,
-            timeout=timeout,
+            stdin=subprocess.DEVNULL if dimacs_file is not None else subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
             encoding="utf-8"
         )
+        # Feed and drain the pipes in threads, so that a chatty solver can't block while we're still writing. The output
+        # is parsed as it arrives.
+        out = []
+        err = []
+        threads = [
+            threading.Thread(target=parse_pipe, args=(sat_solver_process.stdout, out)),
+            threading.Thread(target=read_pipe, args=(sat_solver_process.stderr, err))
+        ]
+        if dimacs_file is None:
+            threads.append(threading.Thread(
+                target=write_pipe,
+                args=(sat_solver_process.stdin, clauses, number_of_variables)
+            ))
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        try:
+            sat_solver_process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            sat_solver_process.kill()
+            sat_solver_process.wait()
+            end_time = time.time()
+            return Status.TIMEOUT, None, end_time - start_time
+        finally:
+            # Don't leave the solver running if the wait was interrupted
+            if sat_solver_process.poll() is None:
+                sat_solver_process.kill()
+                sat_solver_process.wait()
+            for thread in threads:
+                thread.join()
         end_time = time.time()
-    except subprocess.TimeoutExpired:
-        end_time = time.time()
-        return Status.TIMEOUT, None, end_time - start_time
+    finally:
+        if dimacs_file is not None:
+            dimacs_file.close()
 
     log('Done\n', -1)
     time_taken = end_time - start_time
     log('Time taken: ' + str(time_taken))
 
-    if sat_solver_process.stderr:
-        log('Error: "' + sat_solver_process.stderr + '"')
+    err = "".join(err)
+    if err:
+        log('Error: "' + err + '"')
         return Status.ERROR, None, None
 
-    out = sat_solver_process.stdout
-    log("SAT solver output:", 1)
-    log(out)
+    if isinstance(out[0], Exception):
+        raise out[0]
+    status, solution = out[0]
+
+    log('Done\n', -1)
+    return status, solution, time_taken
+
+
+@profiled("portfolio_solve")
+def portfolio_solve(clauses, number_of_variables, portfolio=None, timeout=None):
+    """Runs several solvers at once on the given clauses, returning the first definitive answer
+
+    Each member of the portfolio is the name of a solver in /solvers, optionally followed by the parameters to run it
+    with (so one solver can appear several times with different seeds or configurations). As soon as one member finds
+    the clauses satisfiable or unsatisfiable, the rest are killed."""
+
+    log('Solving with a portfolio...', 1)
+
+    if portfolio is None:
+        portfolio = settings.portfolio
+    assert len(portfolio) > 0, "The portfolio needs at least one solver"
+
+    log('Writing DIMACS file...', 1)
+    dimacs_file = tempfile.NamedTemporaryFile("w", prefix="lls_", suffix=".cnf", encoding="utf-8")
+    src.formatting.write_dimacs(clauses, number_of_variables, dimacs_file)
+    dimacs_file.flush()
     log('Done\n', -1)
-    log('Parsing SAT solver output...', 1)
-    status, solution = src.formatting.format_dimacs_output(out)
+
+    log('Solving with ' + ", ".join('"' + member + '"' for member in portfolio) + ' ... (Start time: ' + time.ctime()
+        + ")", 1)
+
+    results = queue.Queue()
+    processes = []
+    status, solution, winner = Status.ERROR, None, None
+    try:
+        start_time = time.time()
+        for index, member in enumerate(portfolio):
+            solver, _, parameters = member.strip(" ").partition(" ")
+            command = solver_command(solver, parameters or None)
+            if solver in settings.solvers_reading_files:
+                command.append(dimacs_file.name)
+                stdin = subprocess.DEVNULL
+            else:
+                stdin = open(dimacs_file.name, "r")
+            try:
+                process = subprocess.Popen(
+                    command,
+                    stdin=stdin,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    encoding="utf-8"
+                )
+            finally:
+                if stdin is not subprocess.DEVNULL:
+                    stdin.close()
+            processes.append(process)
+            thread = threading.Thread(target=wait_for_process, args=(process, index, results))
+            thread.daemon = True
+            thread.start()
+
+        for _ in processes:
+            remaining_time = None if timeout is None else max(timeout - (time.time() - start_time), 0)
+            try:
+                index, out, err = results.get(timeout=remaining_time)
+            except queue.Empty:
+                status = Status.TIMEOUT
+                break
+            if err:
+                log('Error from "' + portfolio[index] + '": "' + err + '"')
+                continue
+            try:
+                status, solution = src.formatting.format_dimacs_output(out)
+            except Exception as exception:
+                log('Unusable output from "' + portfolio[index] + '": ' + str(exception))
+                continue
+            winner = index
+            break
+        end_time = time.time()
+    finally:
+        for process in processes:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+        dimacs_file.close()
+
     log('Done\n', -1)
+    time_taken = end_time - start_time
+    log('Time taken: ' + str(time_taken))
+    if winner is not None:
+        log('Answered first by "' + portfolio[winner] + '"', 0, 1)
 
     log('Done\n', -1)
     return status, solution, time_taken
+
+
+@profiled("cube_solve")
+def cube_solve(clauses, number_of_variables, splitting_variables, solver=None, parameters=None, timeout=None,
+               number_of_solutions=1, processes=None):
+    """Splits the problem into cubes and solves them in parallel (cube and conquer)
+
+    Every combination of values of the splitting variables is a cube, solved by its own solver process, with up to
+    `processes` of them running at once. Returns the status, the solutions found (at most number_of_solutions, each
+    from a different cube, so all distinct) and the time taken."""
+
+    log('Solving with cube and conquer...', 1)
+
+    if solver is None:
+        solver = settings.solver
+    if processes is None:
+        processes = os.cpu_count()
+
+    cubes = list(itertools.product(*[(variable, -variable) for variable in splitting_variables]))
+    log('Splitting on ' + str(len(splitting_variables)) + ' variables into ' + str(len(cubes)) + ' cubes')
+
+    log('Writing DIMACS file...', 1)
+    dimacs_file = tempfile.NamedTemporaryFile("w", prefix="lls_", suffix=".cnf", encoding="utf-8")
+    src.formatting.write_dimacs(clauses, number_of_variables, dimacs_file)
+    dimacs_file.flush()
+    log('Done\n', -1)
+
+    log('Solving with "' + solver + '" in ' + str(processes) + ' processes ... (Start time: ' + time.ctime() + ")", 1)
+
+    stop = threading.Event()
+    lock = threading.Lock()
+    running = set()
+
+    def solve_cube(cube):
+        """Solves one cube, returning its status and solution, or None if the search stopped first"""
+        command = solver_command(solver, parameters)
+        cube_file = None
+        if solver in settings.solvers_reading_files:
+            cube_file = tempfile.NamedTemporaryFile("w", prefix="lls_", suffix=".cnf", encoding="utf-8")
+            write_cube(cube_file, cube, number_of_variables, len(clauses), dimacs_file.name)
+            cube_file.flush()
+            command.append(cube_file.name)
+        try:
+            with lock:
+                if stop.is_set():
+                    return None
+                process = subprocess.Popen(
+                    command,
+                    stdin=subprocess.DEVNULL if cube_file is not None else subprocess.PIPE,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    encoding="utf-8"
+                )
+                running.add(process)
+            out = []
+            err = []
+            threads = [
+                threading.Thread(target=read_pipe, args=(process.stdout, out)),
+                threading.Thread(target=read_pipe, args=(process.stderr, err))
+            ]
+            if cube_file is None:
+                threads.append(threading.Thread(
+                    target=write_cube_pipe,
+                    args=(process.stdin, cube, number_of_variables, len(clauses), dimacs_file.name)
+                ))
+            for thread in threads:
+                thread.daemon = True
+                thread.start()
+            process.wait()
+            for thread in threads:
+                thread.join()
+            with lock:
+                running.discard(process)
+                if stop.is_set():
+                    return None
+        finally:
+            if cube_file is not None:
+                cube_file.close()
+
+        err = "".join(err)
+        if err:
+            log('Error: "' + err + '"')
+            return Status.ERROR, None
+        try:
+            return src.formatting.format_dimacs_output("".join(out))
+        except Exception as exception:
+            log('Unusable solver output: ' + str(exception))
+            return Status.ERROR, None
+
+    solutions = []
+    counts = collections.Counter()
+    timed_out = False
+    start_time = time.time()
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=processes) as executor:
+            try:
+                pending = set(executor.submit(solve_cube, cube) for cube in cubes)
+                while pending and len(solutions) < number_of_solutions:
+                    remaining_time = None if timeout is None else max(timeout - (time.time() - start_time), 0)
+                    done, pending = concurrent.futures.wait(
+                        pending, timeout=remaining_time, return_when=concurrent.futures.FIRST_COMPLETED)
+                    if not done:
+                        timed_out = True
+                    for future in done:
+                        result = future.result()
+                        if result is not None:
+                            status, solution = result
+                            counts[status] += 1
+                            if status == Status.SAT and len(solutions) < number_of_solutions:
+                                solutions.append(solution)
+                    if timed_out:
+                        break
+            finally:
+                # Stop the cubes that haven't finished, even if the search was interrupted
+                with lock:
+                    stop.set()
+                    for process in running:
+                        process.kill()
+        end_time = time.time()
+    finally:
+        dimacs_file.close()
+
+    log('Done\n', -1)
+    time_taken = end_time - start_time
+    log('Time taken: ' + str(time_taken))
+    log('Cubes solved: ' + ", ".join(
+        str(counts[status]) + " " + status.value.lower() for status in Status if counts[status]))
+
+    if solutions:
+        status = Status.SAT
+    elif timed_out:
+        status = Status.TIMEOUT
+    elif counts[Status.ERROR]:
+        status = Status.ERROR
+    else:
+        status = Status.UNSAT
+
+    log('Done\n', -1)
+    return status, solutions, time_taken
+
+
+def write_cube(output_file, cube, number_of_variables, number_of_clauses, dimacs_file_name):
+    """Writes a DIMACS file with the clauses in the given DIMACS file, plus a unit clause for each literal of the cube"""
+    output_file.write(f"p cnf {number_of_variables} {number_of_clauses + len(cube)}\n")
+    output_file.write("".join(str(literal) + " 0\n" for literal in cube))
+    with open(dimacs_file_name, "r", encoding="utf-8") as dimacs_file:
+        dimacs_file.readline()  # Skip the header
+        shutil.copyfileobj(dimacs_file, output_file)
+
+
+def write_cube_pipe(pipe, cube, number_of_variables, number_of_clauses, dimacs_file_name):
+    """Streams a cube into a pipe in DIMACS format, then closes it"""
+    try:
+        write_cube(pipe, cube, number_of_variables, number_of_clauses, dimacs_file_name)
+    except (BrokenPipeError, ValueError):
+        # The solver has stopped reading (or been killed)
+        pass
+    finally:
+        try:
+            pipe.close()
+        except (BrokenPipeError, ValueError):
+            pass
+
+
+def solver_command(solver, parameters=None):
+    """The command line that runs the given solver in /solvers"""
+    parameter_list = parameters.strip(" ").split(" ") if parameters is not None else []
+    solver_path = sys.path[0] + "/solvers/" + solver
+    return [solver_path] + parameter_list
+
+
+def wait_for_process(process, index, results):
+    """Waits for a solver to finish, putting its index and output in the results queue"""
+    out, err = process.communicate()
+    results.put((index, out, err))
+
+
+def write_pipe(pipe, clauses, number_of_variables):
+    """Streams the clauses into a pipe in DIMACS format, then closes it"""
+    try:
+        src.formatting.write_dimacs(clauses, number_of_variables, pipe)
+    except (BrokenPipeError, ValueError):
+        # The solver has stopped reading (or been killed)
+        pass
+    finally:
+        try:
+            pipe.close()
+        except (BrokenPipeError, ValueError):
+            pass
+
+
+def parse_pipe(pipe, output):
+    """Parses a solver's output as it's read from a pipe, putting the status and model (or the exception raised) in the
+    output list
+
+    The lines are only echoed to the log if the verbosity is high enough for it."""
+    try:
+        output.append(src.formatting.parse_dimacs_output(echo_lines(pipe)))
+    except Exception as exception:
+        output.append(exception)
+    finally:
+        # Drain whatever is left, so that the solver can't block
+        for _ in pipe:
+            pass
+        pipe.close()
+
+
+def echo_lines(lines):
+    """Passes lines on, logging them if the verbosity is high enough"""
+    for line in lines:
+        if src.logging.verbosity_level >= 3:
+            log(line.rstrip("\n"))
+        yield line
+
+
+def read_pipe(pipe, output):
+    """Reads a pipe until it's closed, collecting what was read in the output list"""
+    output.append(pipe.read())
+    pipe.close()
+
+
+class IncrementalSolver:
+    """
+    A SAT solver kept alive in-process between calls
+
+    Clauses added to the clause list since the last call are passed
+    on to the solver, which keeps everything it has learnt. Needs
+    PySAT (pip install python-sat), and uses one of its solvers.
+
+    """
+
+    def __init__(self, solver=None):
+        assert pysat is not None, "Incremental solving needs PySAT (pip install python-sat)"
+        if solver is None:
+            solver = settings.incremental_solver
+        self.name = solver
+        self.solver = pysat.solvers.Solver(name=solver)
+        self.number_of_clauses = 0
+
+    def add_clauses(self, clauses):
+        """Pass on any clauses the solver hasn't seen yet"""
+        new_clauses = clauses[self.number_of_clauses:]
+        if new_clauses:
+            log('Adding ' + str(len(new_clauses)) + ' clauses to the solver')
+            self.solver.append_formula(new_clauses)
+        self.number_of_clauses = len(clauses)
+
+    @profiled("IncrementalSolver.solve")
+    def solve(self, clauses, timeout=None, assumptions=()):
+        """Solve the clauses, returning the status, the solution (if any) and the time taken"""
+
+        self.add_clauses(clauses)
+        log('Solving incrementally with "' + self.name + '" ... (Start time: ' + time.ctime() + ")", 1)
+
+        timer = None
+        if timeout is not None:
+            timer = threading.Timer(timeout, self.solver.interrupt)
+            timer.start()
+        start_time = time.time()
+        result = self.solver.solve_limited(assumptions=list(assumptions), expect_interrupt=timer is not None)
+        end_time = time.time()
+        if timer is not None:
+            timer.cancel()
+            self.solver.clear_interrupt()
+
+        log('Done\n', -1)
+        time_taken = end_time - start_time
+        log('Time taken: ' + str(time_taken))
+
+        if result is None:
+            return Status.TIMEOUT, None, time_taken
+        elif result:
+            return Status.SAT, set(self.solver.get_model()), time_taken
+        else:
+            return Status.UNSAT, None, time_taken
+
+    @profiled("IncrementalSolver.minimal_core")
+    def minimal_core(self, clauses, literals):
+        """A subset of the literals that the clauses rule out, and that they no longer rule out if any is dropped
+
+        The clauses must rule out all the literals together. This starts from the core the solver gives, then tries
+        dropping each of its literals in turn, which takes one solve per literal of the core (with no timeout)."""
+
+        self.add_clauses(clauses)
+        if self.solver.solve(assumptions=list(literals)):
+            return list(literals)
+        core = set(self.solver.get_core() or [])
+        for literal in list(core):
+            if literal not in core:
+                continue
+            candidate = core - {literal}
+            if not self.solver.solve(assumptions=sorted(candidate)):
+                core = candidate.intersection(self.solver.get_core() or [])
+        return [literal for literal in literals if literal in core]
+
+    def delete(self):
+        self.solver.delete()
@@ -0,0 +1,848 @@
+import argparse
+import contextlib
+import copy
+import functools
+import sys
+import os
+import re
+import src.files
+import src.cnf_cache
+import src.checkpoint
+import src.profiling
+import src.cardinality
+import settings
+import src.literal_manipulation
+import src.logging
+import src.formatting
+from src.SearchPattern import SearchPattern, UnsatInPreprocessing
+from src.preprocessing import Preprocessor
+from src.logging import log
+from src.sat_solvers import Status, sat_solve, portfolio_solve, cube_solve, IncrementalSolver
+from src.utilities import make_grid
+
+parser = argparse.ArgumentParser()
+parser.add_argument(
+    'input_file_name',
+    nargs='?',
+    default=None,
+    help="Name of file containing search pattern. LLS looks in current directory and then search_patterns/"
+)
+parser.add_argument(
+    '-b', '--blank_search_pattern',
+    nargs="+",
+    type=int,
+    metavar="BOUNDS",
+    default=None,
+    help="""Creates a blank_search_pattern with size BOUND_1 by BOUND_2, and duration BOUND_3. If BOUND_3 isn't present, assume duration is period + 1. If BOUND_2 isn't present, assume bounding box is square."""
+)
+
+parser.add_argument(
+    '-s', '--symmetry',
+    nargs="*",
+    action="append",
+    default=[],
+    help="""Impose a symmetry on the pattern Examples: "D4x" enforces reflection symmetry about both axes, "p7" enforces period 7, "p2 RE\ x1" imposes the glide-reflect symmetry of a glider."""
+)
+parser.add_argument(
+    '-a', '--asymmetry',
+    nargs="*",
+    action="append",
+    default=[],
+    help="""Impose an asymmetry on the pattern."""
+)
+parser.add_argument(
+    '-c', '--force_change',
+    nargs="*",
+    action="append",
+    type=int,
+    default=[],
+    help='Forces the first two generations to be different, or the two given generations to be different'
+)
+parser.add_argument(
+    "-p", "--population", "--pop",
+    action='append',
+    nargs="*",
+    default=[],
+    metavar=("constraint", "GEN_0"),
+    help=""""Imposes a constraint on the population. Examples: "<10", ">=20", "=15". The population is measured in the first generation by default, or otherwise summed over all generations mentioned. A cardinality encoding can be chosen for the constraint by adding it to the end, as in "<10:sorting_network"."""
+)
+parser.add_argument(
+    '-o', '--output_file_name',
+    default=None,
+    help='File for the output to be saved to'
+)
+parser.add_argument(
+    '-M', '--method',
+    type=int,
+    default=None,
+    help='Which method to encode transitions in CNF (default is "0" for Life, and "3" otherwise)'
+)
+parser.add_argument(
+    '-S', '--solver',
+    default=None,
+    help='Which SAT solver to use (default is glucose-syrup)'
+)
+parser.add_argument(
+    '-t', '--timeout',
+    type=int,
+    default=None,
+    help='Program will time out if the solver runs for longer than TIMEOUT seconds'
+)
+parser.add_argument(
+    '--csv',
+    action='store_const',
+    default=None,
+    const="csv",
+    help="Give output in csv format rather than the usual RLE."
+)
+parser.add_argument(
+    '--blk',
+    action='store_const',
+    default=None,
+    const="blk",
+    help="Give output in unicode block format rather than the usual RLE."
+)
+parser.add_argument(
+    '-V', '--version',
+    action="store_true",
+    help='Displays the version number'
+)
+parser.add_argument(
+    '-v', '--verbosity',
+    type=int,
+    default=settings.verbosity,
+    help="""Set the verbosity. Options: 0 - No output. Only useful with -o option to save solution to file. 1 - Only display the solution. 2 (Default) - Displays some information about what the program is doing, some statistics, and the solution. 3 - A huge torrent of information."""
+)
+parser.add_argument(
+    "-n", "--number_of_solutions",
+    type=int,
+    nargs="?",
+    default=1,
+    const=float('inf'),
+    help="Number of solutions to find, or (if no number is given) all of them."
+)
+parser.add_argument(
+    "--distinct_objects",
+    action="store_true",
+    help="With -n, count every phase, rotation, reflection and translation of a solution as the same solution, and rule them all out as soon as it's found"
+)
+parser.add_argument(
+    "--save_dimacs",
+    nargs="?",
+    default=None,
+    const=True,
+    help="Save the DIMACS file (to the given filename, or to a default if one isn't given)"
+)
+parser.add_argument(
+    "--save_state",
+    nargs="?",
+    default=None,
+    const=True,
+    help="Save the state (to the given filename, or to a default if one isn't given)"
+)
+parser.add_argument(
+    "--profile",
+    nargs="?",
+    default=None,
+    const=True,
+    help="Record the time, CPU time, peak memory use and clauses and variables added by each phase of the search, and save them as JSON (to the given filename, or to a default if one isn't given)"
+)
+parser.add_argument(
+    "--incremental",
+    nargs="?",
+    default=None,
+    const=settings.incremental_solver,
+    metavar="SOLVER",
+    help="Keep one solver running in-process between solutions, so that it remembers what it has learnt (needs PySAT). Optionally give the name of the PySAT solver to use."
+)
+parser.add_argument(
+    "--minimize",
+    nargs="+",
+    default=None,
+    metavar=("QUANTITY", "GEN_0"),
+    help='Find the smallest possible QUANTITY (only "population" so far), measured in the first generation by default, or otherwise summed over all generations mentioned. The bound is tightened in one incremental solver until it\'s proved optimal (needs PySAT).'
+)
+parser.add_argument(
+    "--portfolio",
+    nargs="*",
+    default=None,
+    metavar="SOLVER",
+    help='Run several solvers at once and take the first answer. Each is a solver in /solvers, optionally followed by its parameters (for example "kissat --seed=1"). If none are given, the portfolio in settings.py is used.'
+)
+parser.add_argument(
+    "--cubes",
+    type=int,
+    default=None,
+    metavar="DEPTH",
+    help="Cube and conquer: split the search on DEPTH cells from the middle of the first generation, and solve the 2^DEPTH cubes in parallel."
+)
+parser.add_argument(
+    "--processes",
+    type=int,
+    default=None,
+    help="Number of cubes to solve at once with --cubes (default is the number of CPUs)"
+)
+parser.add_argument(
+    "--load_state",
+    default=None,
+    metavar="STATE_FILE",
+    help="Load a search pattern saved with --save_state, skipping all preprocessing (patterns and constraints given on the command line are ignored)"
+)
+parser.add_argument(
+    "--no_cnf_cache",
+    action="store_true",
+    help="Don't look for the clauses in (or save them to) the cache of earlier searches."
+)
+parser.add_argument(
+    "--preprocess",
+    action="store_true",
+    help="Simplify the clauses before they go to the solver (unit propagation, removing duplicate and subsumed clauses, and eliminating auxiliary variables)"
+)
+parser.add_argument(
+    "--dry_run",
+    action="store_true",
+    help="Don't run the solver, but do preprocess."
+)
+parser.add_argument(
+    '--parameters',
+    type=str,
+    default=None,
+    help='Parameters to pass to the SAT solver. Note that you have to use the format like --parameters="-nthreads=8", or else Python\'s argparse will have a hissy fit.'
+)
+parser.add_argument(
+    "-r", '--rule',
+    type=str,
+    default=settings.rulestring,
+    help="""Which rule to use. Rules can also be specified as partial rules, by adding a "p" to the front. For example "pB3a-c/S23" allows any of the transitions from Life, except 3a must be present and 3c must not. Can also specify rule as a Python dictionary, like so: {'S4e': '0', 'S4a': '0', 'S4c': '0', 'S4n': '0', 'S4i': '0', 'S4j': '0', 'S4k': '0', 'S4t': '0', 'S4w': '0', 'S4q': '0', 'S4r': '0', 'S4y': '0', 'S4z': '0', 'B2n': '0', 'B2k': '0', 'B2i': '0', 'B2e': '0', 'B2c': '0', 'B2a': '0', 'S5e': '0', 'S5c': '0', 'S5a': '0', 'S5n': '0', 'S5k': '0', 'S5j': '0', 'S5i': '0', 'S5r': '0', 'S5q': '0', 'S5y': '0', 'B5y': '0', 'B5r': '0', 'B5q': '0', 'B5j': '0', 'B5k': '0', 'B5i': '0', 'B5n': '0', 'B5c': '0', 'B5a': '0', 'B5e': '0', 'S6n': '0', 'B0c': '0', 'S6k': '0', 'S6i': '0', 'S6e': '0', 'S6c': '0', 'S6a': '0', 'B8c': '0', 'S7c': '0', 'S7e': '0', 'B3y': 'r_7', 'B3q': 'r_5', 'B3r': 'r_6', 'B3n': 'r_4', 'B3i': 'r_1', 'B3j': 'r_2', 'B3k': 'r_3', 'B3e': 'r_0', 'B3a': '1', 'B3c': '0', 'S8c': '0', 'B6c': '0', 'B6a': '0', 'B6e': '0', 'B6k': '0', 'B6i': '0', 'S0c': '0', 'B6n': '0', 'B1e': '0', 'B1c': '0', 'S1c': '0', 'S1e': '0', 'S2c': 'r_9', 'S2a': 'r_8', 'S2e': 'r_10', 'S2k': 'r_12', 'S2i': 'r_11', 'S2n': 'r_13', 'B4t': '0', 'B4w': '0', 'B4q': '0', 'B4r': '0', 'B4y': '0', 'B4z': '0', 'B4e': '0', 'S3n': 'r_20', 'B4a': '0', 'B4c': '0', 'B4n': '0', 'B4i': '0', 'B4k': '0', 'B4j': '0', 'S3y': 'r_23', 'S3q': 'r_21', 'S3r': 'r_22', 'B7c': '0', 'S3i': 'r_17', 'B7e': '0', 'S3k': 'r_19', 'S3j': 'r_18', 'S3e': 'r_16', 'S3a': 'r_14', 'S3c': 'r_15'}"""
+)
+parser.add_argument(
+    '--background', "--bg",
+    nargs=1,
+    default=None,
+    help="""Specify a background, default is vacuum"""
+)
+parser.add_argument(
+    '--background_offset', "--bgos",
+    nargs=3,
+    type=int,
+    default=None,
+    help="""Specify a background offset"""
+)
+parser.add_argument(
+    '--max_change',
+    type=str,
+    default=None,
+    help='Maximum number of cells allowed to differ from how they are in the first generation (optionally followed by :ENCODING, as with -p)'
+)
+parser.add_argument(
+    '--max_decay',
+    type=str,
+    default=None,
+    help='Maximum number of live cells allowed to differ from how they are in the first generation (optionally followed by :ENCODING, as with -p)'
+)
+parser.add_argument(
+    '--max_growth',
+    type=str,
+    default=None,
+    help='Maximum number of dead cells allowed to differ from how they are in the first generation (optionally followed by :ENCODING, as with -p)'
+)
+
+parser.add_argument(
+    '--break_symmetries',
+    action="store_true",
+    help='Find the rotations and reflections that map the search pattern onto itself, and only look for the solutions that come first in their class, with the cells of the first generation read row by row'
+)
+parser.add_argument(
+    '--cardinality_encoding',
+    choices=src.cardinality.encodings,
+    default=settings.cardinality_encoding,
+    help='How to encode the population constraints and --max_change, --max_decay and --max_growth in CNF, unless the constraint gives its own'
+)
+
+
+def split_encoding(constraint, default_encoding):
+    """Splits the optional ":ENCODING" off the end of a cardinality constraint"""
+    constraint, _, encoding = constraint.partition(":")
+    encoding = encoding or default_encoding
+    assert encoding in src.cardinality.encodings, 'Cardinality encoding "' + encoding + '" not recognised'
+    return constraint, encoding
+
+
+def background_from_file(file_name):
+    """Parses a background file, reusing the result if the file has been parsed before"""
+    return copy.deepcopy(_background_from_file(os.path.realpath(file_name)))
+
+
+@functools.lru_cache(maxsize=None)
+def _background_from_file(file_name):
+    return src.formatting.parse_input_string(src.files.string_from_file(file_name))
+
+
+def create_search_pattern(
+        grid,
+        ignore_transition,
+        background_grid,
+        background_ignore_transition,
+        rulestring,
+        method=None,
+        symmetries=(),
+        asymmetries=(),
+        population_at_most=(),
+        population_at_least=(),
+        population_exactly=(),
+        max_change=None,
+        max_decay=None,
+        max_growth=None,
+        force_change=(),
+        break_symmetries=False
+):
+    """Creates a search pattern, and adds the constraints and the evolution rule to it"""
+
+    search_pattern = SearchPattern(
+        grid,
+        ignore_transition=ignore_transition,
+        background_grid=background_grid,
+        background_ignore_transition=background_ignore_transition,
+        rulestring=rulestring
+    )
+
+    # Constraints that change the grid
+    for symmetry in symmetries:
+        search_pattern.force_symmetry(symmetry)
+
+    # Symmetries are looked for before any clauses are added, and only if no asymmetry is going to be imposed
+    symmetries_to_break = []
+    if break_symmetries and not asymmetries:
+        symmetries_to_break = search_pattern.allowed_symmetries()
+        log("Symmetries to break: " + (", ".join(symmetries_to_break) or "none"))
+
+    search_pattern.remove_redundancies()
+
+    log("Search grid:\n", 1)
+    log(search_pattern.make_string(pattern_output_format="csv", show_background=True))
+    log('Done\n', -1)
+
+    # Constraints that are enforced by clauses
+    for asymmetry in asymmetries:
+        search_pattern.force_asymmetry(asymmetry)
+    for constraint in population_at_most:
+        search_pattern.force_population_at_most(constraint)
+    for constraint in population_at_least:
+        search_pattern.force_population_at_least(constraint)
+    for constraint in population_exactly:
+        search_pattern.force_population_exactly(constraint)
+    if max_change is not None:
+        search_pattern.force_max_change(*max_change)
+    if max_decay is not None:
+        search_pattern.force_max_decay(*max_decay)
+    if max_growth is not None:
+        search_pattern.force_max_growth(*max_growth)
+    for times in force_change:
+        search_pattern.force_change(times)
+    for transformation in symmetries_to_break:
+        search_pattern.force_lex_leader(transformation)
+
+    # The most important bit. Enforces the evolution rules
+    search_pattern.force_evolution(method=method)
+
+    return search_pattern
+
+
+def search_pattern_from_arguments(args):
+    """Creates the search pattern described by the command line arguments, or returns None if it's unsatisfiable"""
+
+    lls_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+    log('Getting search pattern...', 1, 2)
+
+    force_change = []
+    for generations in args.force_change:
+        assert len(generations) in [0, 2], "Wrong number of arguments to -c"
+        if len(generations) == 0:
+            force_change.append([0, 1])
+        elif len(generations) == 2:
+            force_change.append(generations)
+
+    population_at_most = []
+    population_at_least = []
+    population_exactly = []
+    for arguments in args.population:
+        if len(arguments) == 0:
+            population_at_least.append([[0], 1, args.cardinality_encoding])
+        else:
+            constraint, encoding = split_encoding(arguments[0], args.cardinality_encoding)
+            times = [int(t) for t in arguments[1:]] if len(arguments) > 1 else [0]
+            re_match = re.match("(^.*?)(\d*$)", constraint)
+            sign = re_match.group(1)
+            amount = int(re_match.group(2))
+            if sign in ["", "="]:
+                population_exactly.append([times, amount, encoding])
+            elif sign in ["<=", "=<"]:
+                population_at_most.append([times, amount, encoding])
+            elif sign in [">=", "=>"]:
+                population_at_least.append([times, amount, encoding])
+            elif sign == "<":
+                population_at_most.append([times, amount - 1, encoding])
+            elif sign == ">":
+                population_at_least.append([times, amount + 1, encoding])
+
+    # The other cardinality constraints, as [amount, encoding]
+    max_change, max_decay, max_growth = [None, None, None]
+    if args.max_change is not None:
+        amount, encoding = split_encoding(args.max_change, args.cardinality_encoding)
+        max_change = [int(amount), encoding]
+    if args.max_decay is not None:
+        amount, encoding = split_encoding(args.max_decay, args.cardinality_encoding)
+        max_decay = [int(amount), encoding]
+    if args.max_growth is not None:
+        amount, encoding = split_encoding(args.max_growth, args.cardinality_encoding)
+        max_growth = [int(amount), encoding]
+
+    symmetries = []
+    asymmetries = []
+    max_period = 0
+    for symmetry_list, argument_list in [(symmetries, args.symmetry), (asymmetries, args.asymmetry)]:
+        for arguments in argument_list:
+            transformations = []
+            period = None
+            x_translate = None
+            y_translate = None
+            for argument in arguments:
+                re_match = re.match("(^.*?)(\d*$)", argument)
+                letters = re_match.group(1).upper()
+                number = re_match.group(2)
+                if letters == "P":
+                    assert period is None, "Can only have one period at a time"
+                    period = int(number)
+                    max_period = max(max_period, period)
+                elif letters == "X":
+                    assert x_translate is None, "Can only have one x_translate at a time"
+                    x_translate = int(number)
+                elif letters == "Y":
+                    assert y_translate is None, "Can only have one y_translate at a time"
+                    y_translate = int(number)
+                else:
+                    assert transformations == [], "Can only impose one symmetry at a time"
+                    transformation = letters + str(number)
+                    if letters == "RO":
+                        transformations.append(letters + str(int(number) % 4))
+                    elif transformation == "C1":
+                        transformations.append("RO0")
+                    elif transformation == "C2":
+                        transformations.append("ro2")
+                    elif transformation == "C4":
+                        transformations.append("ro1")
+                    elif transformation == "D2-":
+                        transformations.append("re-")
+                    elif transformation == "D2\\":
+                        transformations.append("re\\")
+                    elif transformation == "D2|":
+                        transformations.append("re|")
+                    elif transformation == "D2/":
+                        transformations.append("re/")
+                    elif transformation == "D4+":
+                        transformations += ["re-", "re|"]
+                    elif transformation == "D4X":
+                        transformations += ["re/", "re\\"]
+                    elif transformation == "D8":
+                        transformations += ["re-", "re\\"]
+                    else:
+                        assert transformation in ["RE-", "RE/", "RE|",
+                                                  "RE\\"], 'Symmetry argument "' + transformation + '" not recognized'
+                        transformations.append(transformation)
+            if not transformations:
+                transformations = ["RO0"]
+            if period is None:
+                period = 0
+            if x_translate is None:
+                x_translate = 0
+            if y_translate is None:
+                y_translate = 0
+            for transformation in transformations:
+                symmetry_list.append([transformation, x_translate, y_translate, period])
+
+    ignore_transition = None  # Default value
+
+    if args.background:
+        # Check current directory and then backgrounds/
+        log('Creating background from file "' + args.background[0] + '" ...', 1)
+        if os.path.isfile(args.background[0]):
+            background_file_name = args.background[0]
+        elif os.path.isfile(lls_dir +
+                            "/backgrounds/" + args.background[0]):
+            background_file_name = lls_dir + "/backgrounds/" + args.background[0]
+        else:
+            assert False, "Search pattern file not found"
+        background_grid, background_ignore_transition = background_from_file(background_file_name)
+        log('Done\n', -1)
+    else:
+        (
+            background_grid,
+            background_ignore_transition
+        ) = background_from_file(lls_dir + "/backgrounds/" + settings.background)
+
+    if args.background_offset:
+        src.literal_manipulation.offset_background(background_grid, *args.background_offset)
+        src.literal_manipulation.offset_background(background_ignore_transition, *args.background_offset)
+
+    if args.input_file_name and args.blank_search_pattern:
+        raise Exception("Too many search patterns specified")
+
+    if args.input_file_name:
+        # Check current directory and then search_pattern/
+        log('Creating search pattern from file "' + args.input_file_name + '" ...', 1)
+        if os.path.isfile(args.input_file_name):
+            input_string = src.files.string_from_file(args.input_file_name)
+        elif os.path.isfile(lls_dir + "/search_patterns/" + args.input_file_name):
+            input_string = src.files.string_from_file(lls_dir + "/search_patterns/" + args.input_file_name)
+        else:
+            assert False, "Search pattern file not found"
+        grid, ignore_transition = src.formatting.parse_input_string(input_string)
+        log('Done\n', -1)
+
+    elif args.blank_search_pattern:
+        assert len(args.blank_search_pattern) in range(1, 4), "Wrong number of arguments for bounding box"
+        if len(args.blank_search_pattern) == 1:
+            width = args.blank_search_pattern[0]
+            height = args.blank_search_pattern[0]
+            duration = max_period + 1
+        elif len(args.blank_search_pattern) == 2:
+            width = args.blank_search_pattern[0]
+            height = args.blank_search_pattern[1]
+            duration = max_period + 1
+        elif len(args.blank_search_pattern) == 3:
+            width = args.blank_search_pattern[0]
+            height = args.blank_search_pattern[1]
+            duration = args.blank_search_pattern[2]
+        else:
+            raise Exception("Wrong number of arguments for bounding box")
+        log('Creating blank search pattern...', 1)
+
+        grid = make_grid('*', width, height, duration)
+
+        log("Pattern created:\n" + src.formatting.make_csv(grid) + "\n")
+        log('Done\n', -1)
+    else:
+        log('\nNo pattern specified, getting from STDIN... (End with EOF character)\n', 0, 2)
+        input_string = sys.stdin.read()
+        log('\n', 0, 2)
+        grid, ignore_transition = src.formatting.parse_input_string(input_string)
+
+    log('Done\n', -1, 2)
+    log('Preprocessing...', 1, 2)
+
+    pattern_arguments = dict(
+        grid=grid,
+        ignore_transition=ignore_transition,
+        background_grid=background_grid,
+        background_ignore_transition=background_ignore_transition,
+        rulestring=args.rule.strip(),
+        method=args.method,
+        symmetries=symmetries,
+        asymmetries=asymmetries,
+        population_at_most=population_at_most,
+        population_at_least=population_at_least,
+        population_exactly=population_exactly,
+        max_change=max_change,
+        max_decay=max_decay,
+        max_growth=max_growth,
+        force_change=force_change,
+        break_symmetries=args.break_symmetries
+    )
+
+    # Reuse the clauses from an earlier search with the same pattern and constraints, if there was one
+    cnf_cache_key = None
+    cached = None
+    if settings.cnf_cache_size > 0 and not args.no_cnf_cache:
+        cnf_cache_key = src.cnf_cache.cache_key(pattern_arguments, settings.life_encoding_method)
+        cached = src.cnf_cache.load(cnf_cache_key)
+
+    if cached is not None:
+        src.profiling.note("Clause generation was skipped, as the search pattern was loaded from the CNF cache")
+        unsat, state = cached
+        if unsat:
+            log("Unsatisfiability proved in preprocessing (cached)", 0, 2)
+            log('Done\n', -1, 2)
+            return None
+        search_pattern = SearchPattern.from_state(state)
+    else:
+        try:
+            search_pattern = create_search_pattern(**pattern_arguments)
+        except UnsatInPreprocessing:
+            log("Unsatisfiability proved in preprocessing", 0, 2)
+            log('Done\n', -1, 2)
+            if cnf_cache_key is not None:
+                src.cnf_cache.store(cnf_cache_key, True, None)
+            return None
+        if cnf_cache_key is not None:
+            src.cnf_cache.store(cnf_cache_key, False, search_pattern.state())
+
+    log('Done\n', -1, 2)
+    return search_pattern
+
+
+def minimize_population(search_pattern, times, solver=None, timeout=None, preprocessor=None):
+    """Finds a solution with the smallest population in the given generations
+
+    One incremental solver is used throughout. After each solution a unit clause forces the population below that
+    solution's, until the solver proves that impossible. Returns the status (SAT once the optimum is proved), the best
+    solution found, its population, the time the final proof took and the total solver time."""
+
+    incremental_solver = IncrementalSolver(solver)
+    best_solution = None
+    population = None
+    time_taken = 0
+    try:
+        while True:
+            clauses = preprocessor.update(search_pattern.clauses) if preprocessor is not None else search_pattern.clauses
+            status, solution, extra_time_taken = incremental_solver.solve(clauses, timeout=timeout)
+            time_taken += extra_time_taken
+            if status != Status.SAT:
+                break
+            if preprocessor is not None:
+                solution = preprocessor.extend_model(solution)
+            best_solution = solution
+            population = search_pattern.population(times, solution)
+            log("Found a solution with population " + str(population) + "\n", 0, 2)
+            search_pattern.force_population_below(times, population)
+    finally:
+        incremental_solver.delete()
+
+    if status == Status.UNSAT and best_solution is not None:
+        status = Status.SAT
+    return status, best_solution, population, extra_time_taken, time_taken
+
+
+def search(arguments=None):
+    """Runs a search with the given command line arguments (by default those of this process)
+
+    Returns a record of the outcome: the status, the solutions found and the total solver time."""
+
+    args = parser.parse_args(arguments)
+
+    src.logging.verbosity_level = args.verbosity
+
+    if args.version:
+        log('4', 0, 1)
+        return None
+
+    if args.profile is None:
+        return run_search(args)
+
+    if isinstance(args.profile, str):
+        profile_file = args.profile
+    else:
+        profile_file = src.files.find_free_file_name("lls_profile", ".json")
+    src.profiling.start()
+    try:
+        return run_search(args)
+    finally:
+        src.profiling.write_report(profile_file)
+        src.profiling.stop()
+
+
+def run_search(args):
+    """Runs a search with the given parsed command line arguments"""
+
+    if args.csv:
+        pattern_output_format = args.csv
+    elif args.blk:
+        pattern_output_format = args.blk
+
+    output_file_name = args.output_file_name
+
+    if args.load_state:
+        search_pattern = src.checkpoint.load(args.load_state)
+    else:
+        search_pattern = search_pattern_from_arguments(args)
+        if search_pattern is None:
+            return {"status": Status.UNSAT.value, "solutions": [], "solver_time": 0}
+
+    solutions_remaining = 0 if args.dry_run else args.number_of_solutions
+
+    save_state = args.save_state
+    if save_state:
+        if isinstance(save_state, str):
+            state_file = save_state
+        else:
+            state_file = src.files.find_free_file_name("lls_state", ".lls")
+        src.checkpoint.save(state_file, search_pattern)
+    # Problem statistics
+    log('Width: ' + str(len(search_pattern.grid[0][0])), 0, 2)
+    log('Height: ' + str(len(search_pattern.grid[0])), 0, 2)
+    log('Duration: ' + str(len(search_pattern.grid)) + "\n", 0, 2)
+    log('Number of undetermined cells: ' + str(search_pattern.number_of_cells()), 0, 2)
+    log('Number of variables: ' + str(search_pattern.number_of_variables), 0, 2)
+    log('Number of clauses: ' + str(len(search_pattern.clauses)) + "\n", 0, 2)
+
+    save_dimacs = args.save_dimacs
+    if save_dimacs is not None:
+        if not isinstance(save_dimacs, str):
+            save_dimacs = src.files.find_free_file_name("lls_dimacs", ".cnf")
+        search_pattern.clauses.make_file(save_dimacs, search_pattern.number_of_variables)
+
+    determined = search_pattern.deterministic()
+    show_background = search_pattern.background_nontrivial()
+
+    # Keep the output file open while enumerating, so that every solution is saved as soon as it's found. The output
+    # file, the incremental solver and anything else opened on the way are closed however the search ends.
+    with contextlib.ExitStack() as resources:
+        output_file = resources.enter_context(open(args.output_file_name, "a+")) if args.output_file_name else None
+
+        assert [args.incremental, args.portfolio, args.cubes].count(None) >= 2, \
+            "Only one of --incremental, --portfolio and --cubes can be used"
+        splitting_variables = search_pattern.splitting_variables(args.cubes) if args.cubes is not None else None
+
+        preprocessor = None
+        if args.preprocess and solutions_remaining > 0:
+            frozen_variables = search_pattern.output_variables()
+            if args.minimize is not None:
+                # Tighter bounds reuse the variables of the totalizer trees
+                frozen_variables.update(search_pattern.cardinality_variables.values())
+            preprocessor = Preprocessor(frozen_variables, search_pattern.number_of_variables)
+
+        if args.minimize is not None and solutions_remaining > 0:
+            quantity = args.minimize[0]
+            assert quantity == "population", 'Can\'t minimize "' + quantity + '"'
+            assert [args.portfolio, args.cubes].count(None) == 2, "--minimize can't be used with --portfolio or --cubes"
+            times = [int(t) for t in args.minimize[1:]] or [0]
+            status, solution, population, proof_time, time_taken = minimize_population(
+                search_pattern, times, solver=args.incremental, timeout=args.timeout, preprocessor=preprocessor)
+            found_solutions = []
+            if solution is not None:
+                output_string = src.formatting.make_blk(
+                    search_pattern.grid,
+                    solution,
+                    background_grid=search_pattern.background_grid,
+                    rule=search_pattern.rule,
+                    determined=determined,
+                    show_background=show_background
+                )
+                found_solutions.append(output_string)
+                if status == Status.SAT:
+                    log("Minimum population: " + str(population), 0, 1)
+                    log("Time taken to prove optimality: " + str(proof_time) + "\n", 0, 2)
+                else:
+                    log("Smallest population found: " + str(population) + " (not proved optimal)\n", 0, 1)
+            else:
+                output_string = status.value
+            log(output_string + "\n", 0, 1)
+            if output_file is not None:
+                output_file.write(output_string + "\n")
+            log('Total solver time: ' + str(time_taken), 0, 2)
+            return {
+                "status": status.value,
+                "solutions": found_solutions,
+                "solver_time": time_taken,
+                "minimum": population if status == Status.SAT else None,
+                "proof_time": proof_time if status == Status.SAT else None
+            }
+
+        status = Status.DRYRUN
+        found_solutions = []
+        time_taken = 0
+        incremental_solver = None
+        if args.incremental and solutions_remaining > 0:
+            incremental_solver = IncrementalSolver(args.incremental)
+            resources.callback(incremental_solver.delete)
+
+        def shrink(literals):
+            """Shrinks the literals of a blocking clause to a minimal core, with the incremental solver"""
+            clauses = search_pattern.clauses
+            if preprocessor is not None:
+                clauses = preprocessor.update(clauses)
+            return incremental_solver.minimal_core(clauses, literals)
+
+        while solutions_remaining > 0:
+            clauses = search_pattern.clauses
+            if preprocessor is not None:
+                clauses = preprocessor.update(clauses)
+            if splitting_variables is not None:
+                (
+                    status,
+                    solutions,
+                    extra_time_taken
+                ) = cube_solve(
+                    clauses,
+                    search_pattern.number_of_variables,
+                    splitting_variables,
+                    solver=args.solver,
+                    parameters=args.parameters,
+                    timeout=args.timeout,
+                    number_of_solutions=solutions_remaining,
+                    processes=args.processes
+                )
+            else:
+                if incremental_solver is not None:
+                    (
+                        status,
+                        solution,
+                        extra_time_taken
+                    ) = incremental_solver.solve(
+                        clauses,
+                        timeout=args.timeout
+                    )
+                elif args.portfolio is not None:
+                    (
+                        status,
+                        solution,
+                        extra_time_taken
+                    ) = portfolio_solve(
+                        clauses,
+                        search_pattern.number_of_variables,
+                        portfolio=args.portfolio or None,
+                        timeout=args.timeout
+                    )
+                else:
+                    (
+                        status,
+                        solution,
+                        extra_time_taken
+                    ) = sat_solve(
+                        clauses,
+                        search_pattern.number_of_variables,
+                        solver=args.solver,
+                        parameters=args.parameters,
+                        timeout=args.timeout
+                    )
+                solutions = [solution] if status == Status.SAT else []
+            if preprocessor is not None:
+                solutions = [preprocessor.extend_model(solution) for solution in solutions]
+            time_taken += extra_time_taken
+            if status == Status.SAT:
+                output_strings = [
+                    src.formatting.make_blk(
+                        search_pattern.grid,
+                        solution,
+                        background_grid=search_pattern.background_grid,
+                        rule=search_pattern.rule,
+                        determined=determined,
+                        show_background=show_background
+                    )
+                    for solution in solutions
+                ]
+                solutions_remaining -= len(solutions)
+                found_solutions += output_strings
+            else:
+                output_strings = [status.value]
+            for output_string in output_strings:
+                log(output_string + "\n", 0, 1)
+                if output_file is not None:
+                    log('Writing output file...', 1, 2)
+                    # A blank line separates the solutions
+                    output_file.write(output_string + "\n")
+                    output_file.flush()
+                    log('Done\n', -1, 2)
+            if status == Status.SAT and solutions_remaining > 0:
+                for solution in solutions:
+                    if args.distinct_objects:
+                        search_pattern.force_distinct_object(solution)
+                    elif incremental_solver is not None:
+                        search_pattern.force_distinct(solution, shrink=shrink)
+                    else:
+                        search_pattern.force_distinct(solution)
+            else:
+                break
+
+        log('Total solver time: ' + str(time_taken), 0, 2)
+        return {"status": status.value, "solutions": found_solutions, "solver_time": time_taken}
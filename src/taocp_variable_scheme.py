@@ -1,6 +1,19 @@
-from src.literal_manipulation import implies
+import functools
+import numpy as np
+import src.rules
+from src.literal_manipulation import variable_from_literal, neighbours_from_coordinates
+from src.minimized_truth_table import canonical_rule, prime_implicants, minimum_cover, cube_codes
 
-defined_literals = dict()
+letters = "abcdefg"
+# Auxiliary variables can sit up to this many cells outside the grid they describe
+margin = 2
+
+# Codes used in clause templates. A template is a tuple of signed codes: 1 to 9 stand for the predecessor cell and its
+# 8 neighbours (in the order of src.rules.neighbourhood_index), 10 for the cell itself, 11 to 18 for the variables
+# meaning at least 1 to 8 of the neighbours were alive, and 19 upwards for the variables of the rule
+cell_code = 10
+first_count_code = 10
+first_rule_code = 19
 
 
 def children(letter, x, y):
@@ -42,12 +55,18 @@ def maximum_number_of_live_cells(letter):
         return 1
 
 
-def definition_clauses(search_pattern, grid, x, y, t, letter, at_least):
+def definition_clauses(search_pattern, grid, x, y, t, letter, at_least, background=False):
     """Defines clauses that define variables for Knuth's neighbour counting scheme"""
 
     if letter is None:
         return []
     else:
+        defined = variable_arrays(search_pattern, grid, background)[1]
+        index = index_from_description(letter, at_least, x, y, t)
+        if defined[index]:
+            return []
+        defined[index] = True
+
         (child_1_letter, child_1_x, child_1_y,
          child_2_letter, child_2_x, child_2_y) = children(letter, x, y)
 
@@ -59,52 +78,52 @@ def definition_clauses(search_pattern, grid, x, y, t, letter, at_least):
 
         # If at_least is obviously too small or too big, give the obvious answer
         if at_least <= 0:
-            search_pattern.clauses.append([literal_name(search_pattern, grid, x, y, t, letter, at_least)])
+            search_pattern.clauses.append([literal_name(search_pattern, grid, x, y, t, letter, at_least, background)])
         elif at_least > maximum_number_of_live_cells_1 + maximum_number_of_live_cells_2:
-            search_pattern.clauses.append([-literal_name(search_pattern, grid, x, y, t, letter, at_least)])
+            search_pattern.clauses.append([-literal_name(search_pattern, grid, x, y, t, letter, at_least, background)])
 
         # Otherwise define the appropriate clauses
         else:
             if at_least <= maximum_number_of_live_cells_1:
                 search_pattern.clauses.append(
-                    [-literal_name(search_pattern, grid, child_1_x, child_1_y, t, child_1_letter, at_least),
-                     literal_name(search_pattern, grid, x, y, t, letter, at_least)])
+                    [-literal_name(search_pattern, grid, child_1_x, child_1_y, t, child_1_letter, at_least, background),
+                     literal_name(search_pattern, grid, x, y, t, letter, at_least, background)])
                 child_1_needing_definition.append(at_least)
             for j in range(1, maximum_number_of_live_cells_2 + 1):
                 for i in range(1, maximum_number_of_live_cells_1 + 1):
                     if i + j == at_least:
                         search_pattern.clauses.append([
-                            -literal_name(search_pattern, grid, child_1_x, child_1_y, t, child_1_letter, i),
-                            -literal_name(search_pattern, grid, child_2_x, child_2_y, t, child_2_letter, j),
-                            literal_name(search_pattern, grid, x, y, t, letter, at_least)])
+                            -literal_name(search_pattern, grid, child_1_x, child_1_y, t, child_1_letter, i, background),
+                            -literal_name(search_pattern, grid, child_2_x, child_2_y, t, child_2_letter, j, background),
+                            literal_name(search_pattern, grid, x, y, t, letter, at_least, background)])
                         child_1_needing_definition.append(i)
                         child_2_needing_definition.append(j)
             if at_least <= maximum_number_of_live_cells_2:
                 search_pattern.clauses.append(
-                    [-literal_name(search_pattern, grid, child_2_x, child_2_y, t, child_2_letter, at_least),
-                     literal_name(search_pattern, grid, x, y, t, letter, at_least)])
+                    [-literal_name(search_pattern, grid, child_2_x, child_2_y, t, child_2_letter, at_least, background),
+                     literal_name(search_pattern, grid, x, y, t, letter, at_least, background)])
                 child_2_needing_definition.append(at_least)
 
             if at_least > maximum_number_of_live_cells_2:
                 i = at_least - maximum_number_of_live_cells_2
                 search_pattern.clauses.append(
-                    [literal_name(search_pattern, grid, child_1_x, child_1_y, t, child_1_letter, i),
-                     -literal_name(search_pattern, grid, x, y, t, letter, at_least)])
+                    [literal_name(search_pattern, grid, child_1_x, child_1_y, t, child_1_letter, i, background),
+                     -literal_name(search_pattern, grid, x, y, t, letter, at_least, background)])
                 child_1_needing_definition.append(i)
             for j in range(1, maximum_number_of_live_cells_2 + 1):
                 for i in range(1, maximum_number_of_live_cells_1 + 1):
                     if i + j == at_least + 1:
                         search_pattern.clauses.append([
-                            literal_name(search_pattern, grid, child_1_x, child_1_y, t, child_1_letter, i),
-                            literal_name(search_pattern, grid, child_2_x, child_2_y, t, child_2_letter, j),
-                            -literal_name(search_pattern, grid, x, y, t, letter, at_least)])
+                            literal_name(search_pattern, grid, child_1_x, child_1_y, t, child_1_letter, i, background),
+                            literal_name(search_pattern, grid, child_2_x, child_2_y, t, child_2_letter, j, background),
+                            -literal_name(search_pattern, grid, x, y, t, letter, at_least, background)])
                         child_1_needing_definition.append(i)
                         child_2_needing_definition.append(j)
             if at_least > maximum_number_of_live_cells_1:
                 j = at_least - maximum_number_of_live_cells_1
                 search_pattern.clauses.append(
-                    [literal_name(search_pattern, grid, child_2_x, child_2_y, t, child_2_letter, j),
-                     -literal_name(search_pattern, grid, x, y, t, letter, at_least)])
+                    [literal_name(search_pattern, grid, child_2_x, child_2_y, t, child_2_letter, j, background),
+                     -literal_name(search_pattern, grid, x, y, t, letter, at_least, background)])
                 child_2_needing_definition.append(j)
 
         # Remove duplicates from our lists of child variables we need to define
@@ -113,12 +132,14 @@ def definition_clauses(search_pattern, grid, x, y, t, letter, at_least):
 
         # Define the child variables
         for child_1_at_least in child_1_needing_definition:
-            definition_clauses(search_pattern, grid, child_1_x, child_1_y, t, child_1_letter, child_1_at_least)
+            definition_clauses(search_pattern, grid, child_1_x, child_1_y, t, child_1_letter, child_1_at_least,
+                               background)
         for child_2_at_least in child_2_needing_definition:
-            definition_clauses(search_pattern, grid, child_2_x, child_2_y, t, child_2_letter, child_2_at_least)
+            definition_clauses(search_pattern, grid, child_2_x, child_2_y, t, child_2_letter, child_2_at_least,
+                               background)
 
 
-def literal_name(search_pattern, grid, x, y, t, letter=None, at_least=1):
+def literal_name(search_pattern, grid, x, y, t, letter=None, at_least=1, background=False):
     """Creates a unique variable name to be used in CNF, given coordinates and an extra letter for Knuth's neighbour counting scheme"""
     if at_least > maximum_number_of_live_cells(letter):
         literal = -1
@@ -135,54 +156,143 @@ def literal_name(search_pattern, grid, x, y, t, letter=None, at_least=1):
             background_width = len(search_pattern.background_grid[0][0])
             background_height = len(search_pattern.background_grid[0])
             background_duration = len(search_pattern.background_grid)
-            literal = search_pattern.background_grid[t % background_duration][y % background_height][
-                x % background_width]
+            literal = int(search_pattern.background_grid[t % background_duration][y % background_height][
+                x % background_width])
     else:
-        global defined_literals
-        description = (letter, at_least, x, y, t)
-        if description not in defined_literals:
+        numbers = variable_arrays(search_pattern, grid, background)[0]
+        index = index_from_description(letter, at_least, x, y, t)
+        if numbers[index] == 0:
             search_pattern.number_of_variables += 1
-            defined_literals[description] = search_pattern.number_of_variables
-        literal = defined_literals[description]
+            numbers[index] = search_pattern.number_of_variables
+        literal = int(numbers[index])
 
     return literal
 
 
-def transition_rule(search_pattern, grid, x, y, t):
+def variable_arrays(search_pattern, grid, background):
+    """Gives the arrays holding the numbers of the search pattern's auxiliary variables, and whether they're defined"""
+    if background not in search_pattern.knuth_variables:
+        shape = (len(letters), 9, len(grid), len(grid[0]) + 2 * margin, len(grid[0][0]) + 2 * margin)
+        search_pattern.knuth_variables[background] = np.zeros(shape, dtype=np.int32)
+        search_pattern.defined_knuth_variables[background] = np.zeros(shape, dtype=bool)
+    return search_pattern.knuth_variables[background], search_pattern.defined_knuth_variables[background]
+
+
+def index_from_description(letter, at_least, x, y, t):
+    return letters.index(letter), at_least, t, y + margin, x + margin
+
+
+def count_runs(literals):
+    """Splits a list of literals, indexed by neighbour count, into maximal runs (first, last, literal) of equal ones"""
+    runs = []
+    first = 0
+    for count in range(1, len(literals) + 1):
+        if count == len(literals) or literals[count] != literals[first]:
+            runs.append((first, count - 1, literals[first]))
+            first = count
+    return runs
+
+
+def count_codes(first, last):
+    """Gives the codes of the literals that are false when the number of live neighbours is between first and last"""
+    codes = ()
+    if first > 0:
+        codes += (-(first_count_code + first),)
+    if last < 8:
+        codes += (first_count_code + last + 1,)
+    return codes
+
+
+def implication_codes(literal, cell_sign):
+    """Gives the codes completing a clause that says that the cell is alive (or dead) if the literal is true"""
+    if literal in [-1, 1]:
+        return (cell_code * cell_sign,) if literal == cell_sign else None
+    variable, sign = variable_from_literal(literal)
+    return -(variable - 2 + first_rule_code) * sign * cell_sign, cell_code * cell_sign
+
+
+def rule_templates(rule):
+    """Gives clause templates encoding the rule in terms of neighbour counts, and the rule variables they refer to"""
+    return _rule_templates(tuple(sorted(rule.items())))
+
+
+@functools.lru_cache(maxsize=None)
+def _rule_templates(rule_items):
+    canonical, rule_variables = canonical_rule(dict(rule_items))
+    table = src.rules.transition_table(canonical)
+
+    # The literal the rule gives for each predecessor state and number of live neighbours, or None if that
+    # depends on the arrangement of the neighbours
+    count_literals = {}
+    mixed_counts = []
+    for predecessor_code, predecessor_bit in [(1, 0), (-1, 1)]:
+        slices = [set() for _ in range(9)]
+        for index in range(predecessor_bit << 8, (predecessor_bit + 1) << 8):
+            slices[bin(index & 255).count("1")].add(table[index])
+        count_literals[predecessor_code] = [
+            next(iter(literals)) if len(literals) == 1 else None for literals in slices]
+        mixed_counts += [(predecessor_bit, count) for count in range(9) if len(slices[count]) > 1]
+
+    templates = []
+
+    # Runs of counts where the predecessor state makes no difference (like Knuth's a4 -> dead)
+    uniform = [
+        dead if dead == alive else None
+        for dead, alive in zip(count_literals[1], count_literals[-1])]
+    for first, last, literal in count_runs(uniform):
+        if literal is not None:
+            for cell_sign in [1, -1]:
+                codes = implication_codes(literal, cell_sign)
+                if codes is not None:
+                    templates.append(count_codes(first, last) + codes)
+
+    # Runs of counts for each predecessor state, unless the runs above already cover them
+    for predecessor_code in [1, -1]:
+        for first, last, literal in count_runs(count_literals[predecessor_code]):
+            if literal is not None and any(uniform[count] != literal for count in range(first, last + 1)):
+                for cell_sign in [1, -1]:
+                    codes = implication_codes(literal, cell_sign)
+                    if codes is not None:
+                        templates.append((predecessor_code,) + count_codes(first, last) + codes)
+
+    # Counts where the isotropic letter matters. Knowing the count, neighbourhoods with other counts are don't cares.
+    for predecessor_bit, count in mixed_counts:
+        indices = range(predecessor_bit << 8, (predecessor_bit + 1) << 8)
+        other_counts = frozenset(index for index in indices if bin(index & 255).count("1") != count)
+        for literal in sorted(set(table[index] for index in indices if bin(index & 255).count("1") == count)):
+            on_set = frozenset(index for index in indices if table[index] == literal and index not in other_counts)
+            for cube in minimum_cover(on_set, prime_implicants(on_set, on_set | other_counts)):
+                for cell_sign in [1, -1]:
+                    codes = implication_codes(literal, cell_sign)
+                    if codes is not None:
+                        templates.append(cube_codes(cube) + count_codes(count, count) + codes)
+
+    return tuple(templates), rule_variables
+
+
+def transition_rule(search_pattern, grid, x, y, t, background_grid):
     """Creates clauses enforcing the transition rule at coordinates x, y, t of grid"""
 
     duration = len(grid)
+    background = grid is background_grid
+    templates, rule_variables = rule_templates(search_pattern.rule)
+
+    # The variables a_i mean at least i of the neighbours were alive at time t - 1
+    literals = [None] * first_rule_code + rule_variables
+    literals[1] = literal_name(search_pattern, grid, x, y, (t - 1) % duration, background=background)
+    literals[cell_code] = literal_name(search_pattern, grid, x, y, t, background=background)
 
-    # These clauses define variables a_i meaning at least i of the neighbours were alive at time t - 1
-    definition_clauses(search_pattern, grid, x, y, (t - 1) % duration, "a", at_least=2)
-    definition_clauses(search_pattern, grid, x, y, (t - 1) % duration, "a", at_least=3)
-    definition_clauses(search_pattern, grid, x, y, (t - 1) % duration, "a", at_least=4)
-
-    cell = literal_name(search_pattern, grid, x, y, t)
-    predecessor_cell = literal_name(search_pattern, grid, x, y, (t - 1) % duration)
-    # These clauses implement the cellular automaton rule
-
-    # If there are at least 4 neighbours in the previous generation then the cell dies
-    search_pattern.clauses.append(implies(
-        literal_name(search_pattern, grid, x, y, (t - 1) % duration, "a", at_least=4),
-        -cell))
-    # If there aren't at least 2 neighbours in the previous generation then the cell dies
-    search_pattern.clauses.append(implies(
-        -literal_name(search_pattern, grid, x, y, (t - 1) % duration, "a", at_least=2),
-        -cell))
-    # If the predecessor is dead and there aren't at least 3 neighbours then the cell dies
-    search_pattern.clauses.append(implies([
-        -predecessor_cell,
-        -literal_name(search_pattern, grid, x, y, (t - 1) % duration, "a", at_least=3)],
-        -cell))
-    # If there are exactly 3 neighbours then the cell lives
-    search_pattern.clauses.append(implies([
-        -literal_name(search_pattern, grid, x, y, (t - 1) % duration, "a", at_least=4),
-        literal_name(search_pattern, grid, x, y, (t - 1) % duration, "a", at_least=3)],
-        cell))
-    # If the predecessor is alive and there are at least 2 neighbours but not at least 4 neighbours then the cell lives
-    search_pattern.clauses.append(implies([
-        predecessor_cell,
-        literal_name(search_pattern, grid, x, y, (t - 1) % duration, "a", at_least=2),
-        -literal_name(search_pattern, grid, x, y, (t - 1) % duration, "a", at_least=4)],
-        cell))
+    for template in templates:
+        for code in template:
+            code = abs(code)
+            if literals[code] is None:
+                if code > first_count_code:
+                    at_least = code - first_count_code
+                    # These clauses define the variables a_i
+                    definition_clauses(search_pattern, grid, x, y, (t - 1) % duration, "a", at_least, background)
+                    literals[code] = literal_name(
+                        search_pattern, grid, x, y, (t - 1) % duration, "a", at_least, background)
+                else:
+                    literals[2:cell_code] = neighbours_from_coordinates(grid, x, y, t, background_grid=background_grid)
+        # These clauses implement the cellular automaton rule
+        search_pattern.clauses.append([literals[code] if code > 0 else -literals[-code] for code in template])
@@ -1,4 +1,12 @@
+import json
+import os
 import subprocess
+import pytest
+
+def number_of_solutions(arguments):
+    completed_process = subprocess.run(['./lls'] + arguments + ['-v', '1'], capture_output=True, text=True)
+    assert completed_process.returncode == 0
+    return sum(line.startswith("x = ") for line in completed_process.stdout.splitlines())
 
 def test_unsat():
     completed_process = subprocess.run(['./lls', '-c', '-s', 'p3', 'x1', '-b6'])
@@ -7,3 +15,104 @@ def test_unsat():
 def test_sat():
     completed_process = subprocess.run(['./lls', '-s', 'D8', '-s', 'p1', '-p', '-b3', '-n'])
     assert completed_process.returncode == 0
+
+def test_minimized_truth_table():
+    completed_process = subprocess.run(['./lls', '-r', 'pB36/S23', '-M', '3', '-s', 'p2', '-c', '-b5'])
+    assert completed_process.returncode == 0
+
+def test_save_dimacs(tmp_path):
+    dimacs_file = tmp_path / "search.cnf"
+    completed_process = subprocess.run(['./lls', '-s', 'p2', '-b4', '--dry_run', '--save_dimacs', str(dimacs_file)])
+    assert completed_process.returncode == 0
+    assert dimacs_file.read_text().startswith("p cnf ")
+
+def test_output_file(tmp_path):
+    output_file = tmp_path / "solutions.txt"
+    completed_process = subprocess.run(['./lls', '-s', 'p1', '-b3', '-n', '3', '-o', str(output_file)])
+    assert completed_process.returncode == 0
+    solutions = output_file.read_text().strip("\n").split("\n\n")
+    assert len(solutions) == 3 and all(solution.startswith("x = ") for solution in solutions)
+
+def test_portfolio():
+    portfolio = ['--portfolio', 'kissat', 'kissat --seed=1']
+    assert number_of_solutions(['-s', 'p1', '-b4', '-n'] + portfolio) == 83
+    assert number_of_solutions(['-s', 'p2', '-c', '-b5', '-n'] + portfolio) == 86
+
+def test_cube_and_conquer():
+    cubes = ['--cubes', '2', '--processes', '2']
+    assert number_of_solutions(['-c', '-s', 'p3', 'x1', '-b6'] + cubes) == 0
+    assert number_of_solutions(['-s', 'p1', '-b4', '-n'] + cubes) == 83
+    assert number_of_solutions(['-s', 'p2', '-c', '-b5', '-n'] + cubes) == 86
+
+def test_batch(tmp_path):
+    manifest = tmp_path / "manifest.jsonl"
+    manifest.write_text('{"id": "blinker", "bounds": [5, 5], "symmetries": ["p2"], "force_change": [[]]}\n'
+                        '{"id": "p3", "bounds": [6], "symmetries": ["p3 x1"], "force_change": [[]]}\n')
+    completed_process = subprocess.run(['./lls_batch', str(manifest), '-j', '2'], capture_output=True, text=True)
+    assert completed_process.returncode == 0
+    statuses = {record["id"]: record["status"] for record in map(json.loads, completed_process.stdout.splitlines())}
+    assert statuses == {"blinker": "Satisfiable", "p3": "Unsatisfiable"}
+
+def test_cnf_cache(tmp_path):
+    dimacs_files = [tmp_path / "uncached.cnf", tmp_path / "cached.cnf"]
+    outputs = []
+    for dimacs_file in dimacs_files:
+        completed_process = subprocess.run(
+            ['./lls', '-s', 'p2', '-c', '-b5', '--dry_run', '--save_dimacs', str(dimacs_file), '-v', '2'],
+            capture_output=True, text=True, env=dict(os.environ, XDG_CACHE_HOME=str(tmp_path / "cache")))
+        assert completed_process.returncode == 0
+        outputs.append(completed_process.stdout)
+    assert "Using cached clauses" not in outputs[0] and "Using cached clauses" in outputs[1]
+    assert dimacs_files[0].read_text() == dimacs_files[1].read_text()
+
+def test_save_and_load_state(tmp_path):
+    state_file = tmp_path / "search.lls"
+    completed_process = subprocess.run(['./lls', '-s', 'p2', '-c', '-b5', '--dry_run', '--save_state', str(state_file)])
+    assert completed_process.returncode == 0
+    completed_process = subprocess.run(['./lls', '--load_state', str(state_file), '-n', '2'])
+    assert completed_process.returncode == 0
+
+def test_minimize_population():
+    pytest.importorskip("pysat")
+    completed_process = subprocess.run(
+        ['./lls', '-s', 'p2', '-c', '-b5', '--minimize', 'population', '-v', '1'], capture_output=True, text=True)
+    assert completed_process.returncode == 0
+    assert "Minimum population: 3" in completed_process.stdout
+
+def test_incremental_enumeration():
+    pytest.importorskip("pysat")
+    assert number_of_solutions(['-s', 'p1', '-b4', '-n', '--incremental']) == 83
+    assert number_of_solutions(['-s', 'p2', '-c', '-b5', '-n', '--incremental']) == 86
+
+def test_preprocess():
+    assert number_of_solutions(['-s', 'p1', '-b4', '-n', '--preprocess']) == 83
+    assert number_of_solutions(['-s', 'p2', '-c', '-b5', '-n', '--preprocess']) == 86
+    assert number_of_solutions(['-s', 'p2', '-c', '-b5', '-p', '<6', '--preprocess', '-n', '2']) == 2
+
+def test_break_symmetries():
+    assert number_of_solutions(['-s', 'p1', '-b4', '-n', '--break_symmetries']) == 20
+    assert number_of_solutions(['-s', 'p2', '-c', '-b5', '-n', '--break_symmetries']) == 15
+
+def test_distinct_objects():
+    assert number_of_solutions(['-s', 'p1', '-b4', '-n', '--distinct_objects']) == 14
+    assert number_of_solutions(['-s', 'p2', '-c', '-b5', '-n', '--distinct_objects']) == 5
+
+def test_profile(tmp_path):
+    profile_file = tmp_path / "profile.json"
+    completed_process = subprocess.run(
+        ['./lls', '-s', 'p2', '-c', '-b5', '--no_cnf_cache', '--profile', str(profile_file)])
+    assert completed_process.returncode == 0
+    phases = [phase["name"] for phase in json.loads(profile_file.read_text())["phases"]]
+    assert "SearchPattern.__init__" in phases and "force_evolution" in phases and "sat_solve" in phases
+
+def test_profile_cached(tmp_path):
+    profile_files = [tmp_path / "uncached.json", tmp_path / "cached.json"]
+    for profile_file in profile_files:
+        completed_process = subprocess.run(
+            ['./lls', '-s', 'p2', '-c', '-b6', '--dry_run', '--profile', str(profile_file)],
+            env=dict(os.environ, XDG_CACHE_HOME=str(tmp_path / "cache")))
+        assert completed_process.returncode == 0
+    report = json.loads(profile_files[1].read_text())
+    phases = [phase["name"] for phase in report["phases"]]
+    assert "cnf_cache_load" in phases and "force_evolution" not in phases
+    assert report["notes"]
@@ -0,0 +1,196 @@
+#! /usr/bin/env python3
+"""Benchmarks clause generation and end-to-end searches on a fixed corpus
+
+Each case is run as its own ./lls process, with the stub solver from /solvers (which reads the DIMACS problem but
+doesn't solve it), so the suite runs offline and measures everything except solving. The results can be saved as the
+baseline, and later results are compared against it: a case regresses if it's slower, bigger or uses more memory than
+the baseline by more than the thresholds allow. Each case is run several times, keeping the best of each measurement,
+so that noise from the machine isn't taken for a regression.
+
+Run from anywhere with "python3 tests/benchmark/benchmark.py", adding --update_baseline to record the baseline. It
+exits with an error if any case fails, regresses or is missing from the baseline, or if there is no baseline.
+
+The committed baseline.json was recorded on one machine. The sizes are the same everywhere, but the times and the
+memory use aren't, so record a new baseline with --update_baseline before comparing on a different machine."""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+lls_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+baseline_file_name = os.path.join(os.path.dirname(os.path.realpath(__file__)), "baseline.json")
+
+# The phases of a profile that aren't part of generating the clauses
+solving_phases = [
+    "write_dimacs", "parse_dimacs_output", "sat_solve", "portfolio_solve", "cube_solve", "IncrementalSolver.solve"]
+
+
+def corpus():
+    """The benchmark cases, as a dictionary from their names to their command line arguments"""
+    cases = {"example_search_pattern": ["example_search_pattern"]}
+    for size in [5, 10, 15, 20, 30]:
+        cases["blank_" + str(size)] = ["-b", str(size), "-s", "p2", "-c"]
+    for background in sorted(os.listdir(os.path.join(lls_dir, "backgrounds"))):
+        cases["background_" + background] = ["-b", "10", "-s", "p2", "--background", background]
+    # Method 1 only works for Life, and method 3 is the default for other rules
+    for rule_name, rule, methods in [
+        ("life", "B3/S23", [0, 1, 2, 3]),
+        ("highlife", "B36/S23", [0, 2, 3]),
+        ("nontotalistic", "B2e3/S23", [0, 2, 3])
+    ]:
+        for method in methods:
+            cases[rule_name + "_method_" + str(method)] = ["-b", "10", "-s", "p2", "-c", "-r", rule, "-M", str(method)]
+    return cases
+
+
+def run_case(arguments):
+    """Runs one case, returning its measurements"""
+    with tempfile.TemporaryDirectory(prefix="lls_benchmark_") as directory:
+        profile_file = os.path.join(directory, "profile.json")
+        dimacs_file = os.path.join(directory, "search.cnf")
+        completed_process = subprocess.run(
+            ["./lls"] + arguments + [
+                "-S", "stub", "-v", "0", "--no_cnf_cache", "--profile", profile_file, "--save_dimacs", dimacs_file],
+            cwd=lls_dir,
+            # Named variables are numbered in the order of a set of strings, so fix the hash seed to make the DIMACS
+            # the same every time
+            env=dict(os.environ, PYTHONHASHSEED="0"),
+            capture_output=True,
+            text=True
+        )
+        if completed_process.returncode != 0:
+            return {"error": completed_process.stderr.strip().splitlines()[-1:]}
+        with open(profile_file, "r") as profile:
+            report = json.load(profile)
+        if os.path.isfile(dimacs_file):
+            with open(dimacs_file, "r") as dimacs:
+                _, _, number_of_variables, number_of_clauses = dimacs.readline().split()
+            dimacs_bytes = os.path.getsize(dimacs_file)
+        else:
+            # Unsatisfiability was proved before any clauses were written
+            number_of_variables, number_of_clauses, dimacs_bytes = 0, 0, 0
+
+    top_level_phases = [phase for phase in report["phases"] if phase["depth"] == 0]
+    preprocessing_time = sum(
+        phase["wall_time"] for phase in top_level_phases if phase["name"] not in solving_phases)
+    return {
+        "preprocessing_time": preprocessing_time,
+        "serialization_time": sum(
+            phase["wall_time"] for phase in report["phases"] if phase["name"] == "write_dimacs"),
+        "total_time": report["wall_time"],
+        "variables": int(number_of_variables),
+        "clauses": int(number_of_clauses),
+        "dimacs_bytes": dimacs_bytes,
+        "clauses_per_second": int(number_of_clauses) / preprocessing_time if preprocessing_time > 0 else None,
+        "peak_rss": report["peak_rss"]
+    }
+
+
+def best_of(arguments, repeat):
+    """Runs one case several times, keeping the best value of each measurement (or returning the first error)"""
+    results = []
+    for _ in range(repeat):
+        result = run_case(arguments)
+        if "error" in result:
+            return result
+        results.append(result)
+    best = {}
+    for measurement in results[0]:
+        values = [result[measurement] for result in results if result[measurement] is not None]
+        best[measurement] = (max if measurement == "clauses_per_second" else min)(values, default=None)
+    return best
+
+
+def regressions(name, result, baseline, time_threshold, time_slack, size_threshold, memory_threshold):
+    """Describes how a result is worse than the baseline, beyond the thresholds
+
+    A time only counts as a regression if it also grew by more than time_slack seconds, as the times of the smallest
+    cases are mostly noise."""
+    problems = []
+    for measurement, threshold, slack in [
+        ("preprocessing_time", time_threshold, time_slack),
+        ("total_time", time_threshold, time_slack),
+        ("clauses", size_threshold, 0),
+        ("variables", size_threshold, 0),
+        ("dimacs_bytes", size_threshold, 0),
+        ("peak_rss", memory_threshold, 0)
+    ]:
+        old, new = baseline.get(measurement), result.get(measurement)
+        if old is not None and new is not None and new > old * threshold and new - old > slack:
+            problems.append(name + ": " + measurement + " went from " + format_value(old) + " to " + format_value(new))
+    return problems
+
+
+def format_value(value):
+    return "{:.3f}".format(value) if isinstance(value, float) else str(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks LLS on a fixed corpus of searches")
+    parser.add_argument("cases", nargs="*", help="Names of the cases to run (default is all of them)")
+    parser.add_argument("--update_baseline", action="store_true", help="Save the results as the baseline")
+    parser.add_argument("--time_threshold", type=float, default=1.5,
+                        help="Largest allowed ratio of a time to its baseline (default 1.5)")
+    parser.add_argument("--time_slack", type=float, default=0.25,
+                        help="Smallest increase in a time, in seconds, that counts as a regression (default 0.25)")
+    parser.add_argument("--size_threshold", type=float, default=1.0,
+                        help="Largest allowed ratio of the number of clauses, variables or bytes of DIMACS to the "
+                             "baseline (default 1.0)")
+    parser.add_argument("--memory_threshold", type=float, default=1.25,
+                        help="Largest allowed ratio of the peak memory use to its baseline (default 1.25)")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Number of times to run each case, keeping the best of each measurement (default 3)")
+    parser.add_argument("-o", "--output_file_name", default=None, help="File to save the results to, as JSON")
+    args = parser.parse_args()
+
+    cases = corpus()
+    names = args.cases or list(cases)
+    for name in names:
+        assert name in cases, 'Benchmark case "' + name + '" not recognised'
+
+    baseline = {}
+    if os.path.isfile(baseline_file_name):
+        with open(baseline_file_name, "r") as baseline_file:
+            baseline = json.load(baseline_file)
+    elif not args.update_baseline:
+        print('No baseline at "' + baseline_file_name + '": record one with --update_baseline')
+        sys.exit(1)
+
+    results = {}
+    failures = []
+    problems = []  # Regressions, and cases missing from the baseline
+    for name in names:
+        results[name] = result = best_of(cases[name], args.repeat)
+        print(name + ": " + ", ".join(key + " " + format_value(value) for key, value in result.items()), flush=True)
+        if "error" in result:
+            failures.append(name + ": failed (" + " ".join(result["error"]) + ")")
+        elif name in baseline:
+            problems += regressions(
+                name, result, baseline[name], args.time_threshold, args.time_slack, args.size_threshold,
+                args.memory_threshold)
+        else:
+            problems.append(name + ": not in the baseline")
+
+    if args.output_file_name:
+        with open(args.output_file_name, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+
+    if args.update_baseline:
+        baseline.update({name: result for name, result in results.items() if "error" not in result})
+        with open(baseline_file_name, "w") as baseline_file:
+            json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+        print('Baseline saved to "' + baseline_file_name + '"')
+        # Regressions against the old baseline don't matter when it's being replaced, but failures still do
+        problems = []
+    if failures or problems:
+        print("\nProblems:")
+        for problem in failures + problems:
+            print("    " + problem)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()